@@ -2,10 +2,12 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from get_transcript import get_transcript, get_demo_transcript
-from split_text import split_text
-from summarize import summarize_chunk, get_summarization_status
-from urllib.parse import urlparse, parse_qs
+from get_transcript import get_transcript, get_demo_transcript, extract_video_id
+from split_text import split_transcript
+from summarize import iter_chunk_titles, get_summarization_status, get_gemini_circuit_status, get_quota_usage
+from emotion_detector import EmotionDetector
+import metrics
+import json
 import time
 import os
 from dotenv import load_dotenv
@@ -25,6 +27,75 @@ st.set_page_config(
 api_key = os.getenv("GEMINI_API_KEY")
 GEMINI_CONFIGURED = bool(api_key and api_key.strip() and not api_key.startswith("your_"))
 
+# Longest emotion timeline we send to the browser
+MAX_TIMELINE_POINTS = 500
+
+
+class TranscriptUnavailable(Exception):
+    """Raised when a video has no usable captions (so the miss isn't cached)"""
+
+
+# Pipeline stages, memoized per (video_id, max_words, mode) so reruns
+# triggered by widget changes don't repeat network or model work.
+# Titles are streamed while they are generated, so they are kept in
+# st.session_state['titles'] instead of st.cache_data.
+# video_id is None for demo content.
+@st.cache_resource
+def load_emotion_detector(use_transformer=False):
+    """
+    One EmotionDetector per scorer, shared by every session. The lexicon
+    scorer is the default; the transformer model is opt-in because it is
+    downloaded and run on CPU before the analytics tab can render.
+    """
+    return EmotionDetector(use_transformer=use_transformer)
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_transcript(video_id):
+    """Transcript text and segments for a video, or the demo transcript"""
+    if video_id is None:
+        return get_demo_transcript("demo")
+    text, transcript = get_transcript(video_id)
+    if not text:
+        raise TranscriptUnavailable(video_id)
+    return text, transcript
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_chapters(video_id, max_words):
+    """Chunk boundaries follow caption segments, so each chapter keeps its real start time"""
+    text, transcript = load_transcript(video_id)
+    with metrics.span("chunking") as span:
+        chapters = list(split_transcript(transcript, max_words=max_words))
+        span.set(chunks=len(chapters))
+    return chapters
+
+
+def chapter_cards_html(chapters, titles, video_id, start=0):
+    """HTML for consecutive chapter cards starting at `start`, rendered in one call"""
+    cards = []
+    for i, title in enumerate(titles, start):
+        start_time = chapters[i]['start']
+        minutes, seconds = divmod(int(start_time), 60)
+        if video_id:
+            link = f'<a href="https://www.youtube.com/watch?v={video_id}&t={int(start_time)}s" target="_blank">▶️ Jump to timestamp</a>'
+        else:
+            link = '<small>Demo content - no video link available</small>'
+        cards.append(
+            f'<div class="chapter-item"><h4>{title}</h4><p>🕐 {minutes:02d}:{seconds:02d}</p>{link}</div>'
+        )
+    return "\n".join(cards)
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_emotion_timeline(video_id, max_words, use_transformer=False):
+    """Downsampled emotion timeline for the analytics tab"""
+    text, transcript = load_transcript(video_id)
+    chapters = build_chapters(video_id, max_words)
+    detector = load_emotion_detector(use_transformer)
+    chunk_emotions = detector.detect_emotions_in_chunks(chapters, transcript)
+    return detector.get_emotion_timeline(chunk_emotions, max_points=MAX_TIMELINE_POINTS)
+
 # Custom CSS for better styling
 st.markdown("""
 <style>
@@ -92,6 +163,10 @@ with st.sidebar:
     st.header("📊 Display Options")
     show_analytics = st.checkbox("Show analytics", True)
     show_preview = st.checkbox("Show chapter previews", False)
+    use_emotion_model = st.checkbox(
+        "Use emotion model (slower)", False,
+        help="Score the emotion timeline with a transformer model instead of the built-in lexicon"
+    )
     
     # API Configuration Section
     st.header("🔧 API Setup")
@@ -141,20 +216,7 @@ with col2:
 
 if generate_button and (video_url or demo_mode):
     # Extract video ID
-    video_id = None
-    if video_url and not demo_mode:
-        query = urlparse(video_url)
-        if query.hostname == 'youtu.be':
-            video_id = query.path[1:]
-        elif query.hostname in ('www.youtube.com', 'youtube.com'):
-            if query.path == '/watch':
-                video_id = parse_qs(query.query).get('v', [None])[0]
-            elif query.path[:7] == '/embed/':
-                video_id = query.path.split('/')[2]
-            else:
-                video_id = None
-        else:
-            video_id = None
+    video_id = extract_video_id(video_url) if video_url and not demo_mode else None
 
     if not video_id and not demo_mode:
         st.error("❌ Invalid YouTube URL. Please check the format or enable Demo Mode.")
@@ -163,145 +225,227 @@ if generate_button and (video_url or demo_mode):
         progress_bar = st.progress(0)
         status_text = st.empty()
         
-        try:
-            # Step 1: Get transcript
-            status_text.text("📝 Fetching transcript...")
-            progress_bar.progress(0.2)
-            
-            if demo_mode:
-                st.info("🎬 Using demo content to showcase features")
-                text, transcript = get_demo_transcript("demo")
-            else:
-                text, transcript = get_transcript(video_id)
-            
-            if not text:
-                st.error("❌ Could not get transcript. The video might not have captions available.")
-                st.info("💡 Try enabling Demo Mode to test the app functionality")
-            else:
+        # Per-run trace of every timed stage, downloadable from the Settings tab
+        with metrics.trace(f"app:{video_id or 'demo'}") as run_trace:
+            try:
+                # Step 1: Get transcript
+                status_text.text("📝 Fetching transcript...")
+                progress_bar.progress(0.2)
+                
+                if demo_mode:
+                    st.info("🎬 Using demo content to showcase features")
+                load_transcript(video_id)
+                
                 # Step 2: Split into chunks
                 status_text.text("✂️ Splitting into chapters...")
                 progress_bar.progress(0.4)
                 
-                chunks = split_text(text, max_words=max_words)
+                chapters = build_chapters(video_id, max_words)
                 
                 # Step 3: Generate chapters
                 method = "AI-powered" if method_type == "premium" else "keyword-based"
                 ai_provider = " (Gemini)" if method_type == "premium" else ""
-                status_text.text(f"🤖 Generating {len(chunks)} {method} chapters{ai_provider}...")
+                status_text.text(f"🤖 Generating {len(chapters)} {method} chapters{ai_provider}...")
                 progress_bar.progress(0.6)
                 
-                chapter_titles = []
-                for i, chunk in enumerate(chunks):
-                    title = summarize_chunk(chunk)
-                    chapter_titles.append(title)
-                    progress_bar.progress(0.6 + (i + 1) / len(chunks) * 0.4)
+                results_key = (video_id, max_words, method_type)
+                titles_store = st.session_state.setdefault('titles', {})
+                if results_key not in titles_store:
+                    # Show each batch of chapters as soon as its titles arrive
+                    live_placeholder = st.empty()
+                    live_chapters = live_placeholder.container()
+                    title_started = time.perf_counter()
+                    chapter_titles = []
+                    title_stats = {}
+                    with metrics.span("title_generation", mode=method_type) as span:
+                        span.set(chunks=len(chapters))
+                        for start, block in iter_chunk_titles([chapter['text'] for chapter in chapters], stats=title_stats):
+                            chapter_titles.extend(block)
+                            if start == 0:
+                                metrics.get_metrics().observe("time_to_first_chapter", time.perf_counter() - title_started, mode=method_type)
+                            live_chapters.markdown(chapter_cards_html(chapters, block, video_id, start), unsafe_allow_html=True)
+                            progress_bar.progress(0.6 + 0.4 * len(chapter_titles) / max(1, len(chapters)))
+                            status_text.text(f"🤖 Generated {len(chapter_titles)}/{len(chapters)} {method} chapters{ai_provider}...")
+                    if method_type == "premium" and title_stats.get("free_titles"):
+                        # Gemini dropped out mid-run: keep these off the premium key so
+                        # the next Generate click retries the missing titles
+                        results_key = (video_id, max_words, "partial")
+                    titles_store[results_key] = chapter_titles
+                    live_placeholder.empty()
                 
-                progress_bar.progress(1.0)
-                status_text.text("✅ Complete!")
-                time.sleep(1)
                 status_text.empty()
                 progress_bar.empty()
                 
-                # Display results
-                success_msg = f"🎉 Successfully generated {len(chapter_titles)} chapters using {method} generation!"
-                if method_type == "premium":
-                    success_msg += " 🤖 (Powered by FREE Gemini AI)"
-                st.success(success_msg)
-                
-                # Tabs for different views
-                tab1, tab2, tab3 = st.tabs(["📑 Chapters", "📊 Analytics", "⚙️ Settings"])
-                
-                with tab1:
-                    st.subheader("📍 Smart Chapters")
-                    
-                    for i, title in enumerate(chapter_titles):
-                        start_time = transcript[i * max_words]['start'] if i * max_words < len(transcript) else 0
-                        minutes, seconds = divmod(int(start_time), 60)
-                        
-                        # Chapter card
-                        st.markdown(f"""
-                        <div class="chapter-item">
-                            <h4>{title}</h4>
-                            <p>🕐 {minutes:02d}:{seconds:02d}</p>
-                            {f'<a href="https://www.youtube.com/watch?v={video_id}&t={int(start_time)}s" target="_blank">▶️ Jump to timestamp</a>' if video_id and not demo_mode else '<small>Demo content - no video link available</small>'}
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        if show_preview:
-                            with st.expander(f"👀 Preview Chapter {i+1}"):
-                                preview = chunks[i][:200] + "..." if len(chunks[i]) > 200 else chunks[i]
-                                st.text(preview)
-                
-                with tab2:
-                    if show_analytics:
-                        st.subheader("📈 Video Analytics")
-                        
-                        # Metrics
-                        col1, col2, col3, col4 = st.columns(4)
-                        
-                        with col1:
-                            st.metric("📑 Chapters", len(chapter_titles))
-                        
-                        with col2:
-                            video_length_min = int(transcript[-1]['start']) // 60 if transcript else 0
-                            st.metric("⏱️ Length", f"{video_length_min} min")
-                        
-                        with col3:
-                            total_words = len(text.split()) if text else 0
-                            st.metric("📝 Words", f"{total_words:,}")
-                        
-                        with col4:
-                            avg_chapter_length = total_words // len(chunks) if chunks else 0
-                            st.metric("📊 Avg Chapter", f"{avg_chapter_length} words")
-                        
-                        # Chapter length distribution
-                        if chunks:
-                            st.subheader("📊 Chapter Length Distribution")
-                            chapter_lengths = [len(chunk.split()) for chunk in chunks]
-                            
-                            fig = px.bar(
-                                x=range(1, len(chapter_lengths) + 1),
-                                y=chapter_lengths,
-                                title="Words per Chapter",
-                                labels={'x': 'Chapter Number', 'y': 'Word Count'}
-                            )
-                            fig.update_layout(showlegend=False)
-                            st.plotly_chart(fig, use_container_width=True)
-                    else:
-                        st.info("Enable 'Show analytics' in the sidebar to see detailed statistics.")
-                
-                with tab3:
-                    st.subheader("⚙️ Configuration & Tips")
-                    
-                    st.markdown("**📝 Chapter Length Optimization:**")
-                    st.markdown("- **50-75 words**: Short, focused chapters")
-                    st.markdown("- **75-125 words**: Balanced chapters (recommended)")
-                    st.markdown("- **125+ words**: Longer, detailed chapters")
-                    
-                    st.markdown("**🎯 Best Results:**")
-                    st.markdown("- Videos with clear speech and good audio")
-                    st.markdown("- Educational or tutorial content")
-                    st.markdown("- Videos with available captions/transcripts")
-                    
-                    st.markdown("**🔧 Current Configuration:**")
-                    st.write(f"- Mode: {method_desc}")
-                    st.write(f"- Words per chapter: {max_words}")
-                    st.write(f"- Total chapters generated: {len(chapter_titles)}")
-                    
-                    if method_type == "premium":
-                        st.markdown("**🤖 AI Provider:**")
-                        st.success("Google Gemini 1.5 Flash (FREE)")
-                        st.info("Enjoying unlimited AI-powered chapters at no cost!")
+                # Remember what was generated so widget changes re-render from the caches
+                st.session_state['results_key'] = results_key
+            
+            except TranscriptUnavailable:
+                progress_bar.empty()
+                status_text.empty()
+                st.session_state.pop('results_key', None)
+                st.error("❌ Could not get transcript. The video might not have captions available.")
+                st.info("💡 Try enabling Demo Mode to test the app functionality")
+            
+            except Exception as e:
+                progress_bar.empty()
+                status_text.empty()
+                st.session_state.pop('results_key', None)
+                st.error(f"❌ An error occurred: {str(e)}")
+                st.info("💡 Try Demo Mode to test the app, or check if the video has captions available.")
         
-        except Exception as e:
-            progress_bar.empty()
-            status_text.empty()
-            st.error(f"❌ An error occurred: {str(e)}")
-            st.info("💡 Try Demo Mode to test the app, or check if the video has captions available.")
+        st.session_state['last_trace'] = run_trace.to_dict()
 
 elif generate_button:
     st.warning("⚠️ Please enter a YouTube URL or enable Demo Mode to test the app.")
 
+# Results are rendered on every rerun from the cached pipeline stages, so
+# toggling display options never refetches or regenerates anything
+if 'results_key' in st.session_state:
+    render_started = time.perf_counter()
+    result_video_id, result_max_words, result_mode = st.session_state['results_key']
+    text, transcript = load_transcript(result_video_id)
+    chapters = build_chapters(result_video_id, result_max_words)
+    chapter_titles = st.session_state['titles'][st.session_state['results_key']]
+    chunks = [chapter['text'] for chapter in chapters]
+    
+    # Display results
+    method = {"premium": "AI-powered", "partial": "partly AI-powered"}.get(result_mode, "keyword-based")
+    success_msg = f"🎉 Successfully generated {len(chapter_titles)} chapters using {method} generation!"
+    if result_mode == "premium":
+        success_msg += " 🤖 (Powered by FREE Gemini AI)"
+    st.success(success_msg)
+    if result_mode == "partial":
+        st.warning("⚠️ Gemini was unavailable for some chapters, so they got keyword-based titles. "
+                   "Click Generate again to retry them.")
+    
+    # Tabs for different views
+    tab1, tab2, tab3 = st.tabs(["📑 Chapters", "📊 Analytics", "⚙️ Settings"])
+    
+    with tab1:
+        st.subheader("📍 Smart Chapters")
+        
+        if show_preview:
+            # Previews need an expander under each card
+            for i, title in enumerate(chapter_titles):
+                st.markdown(chapter_cards_html(chapters, [title], result_video_id, i), unsafe_allow_html=True)
+                with st.expander(f"👀 Preview Chapter {i+1}"):
+                    preview = chunks[i][:200] + "..." if len(chunks[i]) > 200 else chunks[i]
+                    st.text(preview)
+        else:
+            st.markdown(chapter_cards_html(chapters, chapter_titles, result_video_id), unsafe_allow_html=True)
+    
+    with tab2:
+        if show_analytics:
+            st.subheader("📈 Video Analytics")
+            
+            # Metrics
+            col1, col2, col3, col4 = st.columns(4)
+            
+            with col1:
+                st.metric("📑 Chapters", len(chapter_titles))
+            
+            with col2:
+                video_length_min = int(transcript.duration) // 60 if transcript else 0
+                st.metric("⏱️ Length", f"{video_length_min} min")
+            
+            with col3:
+                total_words = len(text.split()) if text else 0
+                st.metric("📝 Words", f"{total_words:,}")
+            
+            with col4:
+                avg_chapter_length = total_words // len(chunks) if chunks else 0
+                st.metric("📊 Avg Chapter", f"{avg_chapter_length} words")
+            
+            # Chapter length distribution
+            if chunks:
+                st.subheader("📊 Chapter Length Distribution")
+                chapter_lengths = [len(chunk.split()) for chunk in chunks]
+                
+                fig = px.bar(
+                    x=range(1, len(chapter_lengths) + 1),
+                    y=chapter_lengths,
+                    title="Words per Chapter",
+                    labels={'x': 'Chapter Number', 'y': 'Word Count'}
+                )
+                fig.update_layout(showlegend=False)
+                st.plotly_chart(fig, use_container_width=True)
+                
+                # Emotion timeline (downsampled so long videos stay responsive)
+                st.subheader("🎭 Emotion Timeline")
+                timeline = build_emotion_timeline(result_video_id, result_max_words, use_emotion_model)
+                
+                minutes = timeline['timestamp'] / 60
+                fig = go.Figure()
+                for column, label in [('overall_excitement', 'Excitement'), ('joy', 'Joy'), ('surprise', 'Surprise')]:
+                    fig.add_trace(go.Scatter(x=minutes, y=timeline[column], mode='lines', name=label))
+                fig.update_layout(
+                    title="Emotions over Time",
+                    xaxis_title="Minute",
+                    yaxis_title="Score"
+                )
+                st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("Enable 'Show analytics' in the sidebar to see detailed statistics.")
+    
+    with tab3:
+        st.subheader("⚙️ Configuration & Tips")
+        
+        st.markdown("**📝 Chapter Length Optimization:**")
+        st.markdown("- **50-75 words**: Short, focused chapters")
+        st.markdown("- **75-125 words**: Balanced chapters (recommended)")
+        st.markdown("- **125+ words**: Longer, detailed chapters")
+        
+        st.markdown("**🎯 Best Results:**")
+        st.markdown("- Videos with clear speech and good audio")
+        st.markdown("- Educational or tutorial content")
+        st.markdown("- Videos with available captions/transcripts")
+        
+        st.markdown("**🔧 Current Configuration:**")
+        st.write(f"- Mode: {method_desc}")
+        st.write(f"- Words per chapter: {result_max_words}")
+        st.write(f"- Total chapters generated: {len(chapter_titles)}")
+        if GEMINI_CONFIGURED:
+            circuit = get_gemini_circuit_status()
+            if circuit['state'] == 'open':
+                st.write(f"- Gemini: paused after {circuit['reason']} limit, retrying in {circuit['retry_in']:.0f}s")
+            else:
+                st.write(f"- Gemini: {circuit['state'].replace('_', '-')}")
+            usage = get_quota_usage()
+            if usage:
+                today = usage['day']
+                st.write(f"- Gemini requests today: {today['interactive']} app / {today['batch']} batch "
+                         f"of {today['limit']}")
+        
+        if result_mode == "premium":
+            st.markdown("**🤖 AI Provider:**")
+            st.success("Google Gemini 1.5 Flash (FREE)")
+            st.info("Enjoying unlimited AI-powered chapters at no cost!")
+        
+        st.markdown("**⏱️ Stage Timings (this server process):**")
+        timing_rows = [
+            {
+                'Stage': row['name'] + (f" ({', '.join(row['labels'].values())})" if row['labels'] else ""),
+                'Runs': row['count'],
+                'p50 (ms)': round(row['p50'] * 1000, 1),
+                'p95 (ms)': round(row['p95'] * 1000, 1),
+            }
+            for row in metrics.get_metrics().summary()
+        ]
+        if timing_rows:
+            st.dataframe(pd.DataFrame(timing_rows), hide_index=True, use_container_width=True)
+        
+        with st.expander("📤 Export metrics"):
+            st.code(metrics.get_metrics().prometheus_text(), language="text")
+            if 'last_trace' in st.session_state:
+                st.download_button(
+                    "⬇️ Download last run trace (JSON)",
+                    json.dumps(st.session_state['last_trace'], indent=2),
+                    file_name="vibechapters_trace.json",
+                    mime="application/json",
+                )
+    
+    metrics.get_metrics().observe("render", time.perf_counter() - render_started)
+
 # Footer
 st.markdown("---")
 col1, col2, col3 = st.columns(3)
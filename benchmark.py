@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Offline performance benchmark for the VibeChapters pipeline.
+
+Usage:
+    python benchmark.py --output bench.json
+    python benchmark.py --compare bench.json
+
+Builds synthetic transcripts from 5 minutes to 10 hours out of the demo
+content, then times each pipeline stage separately (chunking, free titles,
+emotion scoring, aggregation) and records its peak memory. Nothing touches
+the network: titles use the free method and emotions use the lexicon scorer.
+
+Results are written as JSON. With --compare, every stage is checked against
+a previous results file and the script exits with status 1 if any stage got
+slower or hungrier than the allowed tolerance.
+"""
+
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import statistics
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from get_transcript import get_demo_transcript
+from transcript import Transcript
+from split_text import split_text, split_transcript
+from summarize import _summarize_chunk_free, tfidf_keywords
+from emotion_detector import EmotionDetector
+
+# Video lengths to benchmark, in minutes
+DEFAULT_DURATIONS = (5, 30, 60, 180, 600)
+
+# Speaking rate and caption line length used for the synthetic transcripts
+WORDS_PER_MINUTE = 150
+WORDS_PER_SEGMENT = (6, 12)
+
+# Same cap the app uses for the emotion chart
+MAX_TIMELINE_POINTS = 500
+
+
+def synthetic_transcript(minutes, seed=0):
+    """
+    Build a transcript of the given length from shuffled demo sentences.
+    Segments look like YouTube caption lines: a few words each with
+    contiguous start/duration timestamps at a normal speaking rate.
+    """
+    demo_text, _ = get_demo_transcript("demo")
+    sentences = [s.strip() + "." for s in demo_text.replace("!", ".").replace("?", ".").split(".") if s.strip()]
+    rng = random.Random(seed)
+
+    target_words = int(minutes * WORDS_PER_MINUTE)
+    seconds_per_word = 60.0 / WORDS_PER_MINUTE
+    starts, durations, texts = [], [], []
+    words = []
+    total = 0
+    clock = 0.0
+    while total < target_words:
+        if not words:
+            words = rng.choice(sentences).split()
+        take = min(rng.randint(*WORDS_PER_SEGMENT), len(words), target_words - total)
+        line, words = words[:take], words[take:]
+        duration = take * seconds_per_word
+        starts.append(clock)
+        durations.append(duration)
+        texts.append(" ".join(line))
+        clock += duration
+        total += take
+
+    transcript = Transcript.from_columns(starts, durations, texts)
+    return transcript.text, transcript
+
+
+def app_aggregation(chapters, titles, text, transcript):
+    """The numbers the app's chapter and analytics tabs compute"""
+    chunks = [chapter['text'] for chapter in chapters]
+    chapter_lengths = [len(chunk.split()) for chunk in chunks]
+    total_words = len(text.split())
+    return {
+        'chapters': len(titles),
+        'length_min': int(transcript.duration) // 60,
+        'total_words': total_words,
+        'avg_chapter': total_words // len(chunks) if chunks else 0,
+        'chapter_lengths': chapter_lengths,
+        'timestamps': [divmod(int(chapter['start']), 60) for chapter in chapters],
+    }
+
+
+def measure(func, repeat=3):
+    """Median/min wall time over `repeat` runs plus peak traced memory of one run"""
+    # Warm-up run so lazy loads (lexicons, compiled regexes) aren't timed
+    func()
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    # tracemalloc slows everything down, so memory gets its own run
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'median_s': statistics.median(timings),
+        'min_s': min(timings),
+        'peak_kb': peak / 1024,
+    }
+
+
+def benchmark_duration(minutes, max_words=100, repeat=3):
+    """Time every pipeline stage on one synthetic transcript"""
+    text, transcript = synthetic_transcript(minutes)
+    chapters = list(split_transcript(transcript, max_words=max_words))
+    chunks = [chapter['text'] for chapter in chapters]
+    keywords = tfidf_keywords(chunks)
+    titles = [_summarize_chunk_free(chunk, keywords[i]) for i, chunk in enumerate(chunks)]
+    detector = EmotionDetector(use_transformer=False)
+    chunk_emotions = detector.detect_emotions_in_chunks(chapters, transcript)
+
+    stages = [
+        ('split_text', lambda: split_text(text, max_words=max_words)),
+        ('split_transcript', lambda: list(split_transcript(transcript, max_words=max_words))),
+        ('summarize_free', lambda: [_summarize_chunk_free(chunk) for chunk in chunks]),
+        ('tfidf_keywords', lambda: tfidf_keywords(chunks)),
+        ('emotion_scoring', lambda: detector.detect_emotions_in_chunks(chapters, transcript)),
+        ('emotion_aggregation', lambda: (
+            detector.find_highlights(chunk_emotions),
+            detector.get_emotion_timeline(chunk_emotions, max_points=MAX_TIMELINE_POINTS),
+        )),
+        ('app_aggregation', lambda: app_aggregation(chapters, titles, text, transcript)),
+    ]
+
+    results = []
+    for stage, func in stages:
+        result = measure(func, repeat=repeat)
+        result.update({
+            'duration_minutes': minutes,
+            'stage': stage,
+            'words': len(text.split()),
+            'segments': len(transcript),
+            'chunks': len(chunks),
+        })
+        results.append(result)
+    return results
+
+
+def run_benchmarks(durations=DEFAULT_DURATIONS, max_words=100, repeat=3):
+    """Benchmark every duration and return the full results document"""
+    results = []
+    for minutes in durations:
+        print(f"⏱️ Benchmarking {minutes} min transcript...")
+        results.extend(benchmark_duration(minutes, max_words=max_words, repeat=repeat))
+
+    return {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'max_words': max_words,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def print_results(document):
+    """Print one line per (duration, stage)"""
+    print(f"{'minutes':>8} {'stage':<20} {'median ms':>10} {'min ms':>10} {'peak KB':>10}")
+    for r in document['results']:
+        print(f"{r['duration_minutes']:>8} {r['stage']:<20} {r['median_s'] * 1000:>10.2f} "
+              f"{r['min_s'] * 1000:>10.2f} {r['peak_kb']:>10.1f}")
+
+
+def compare_results(current, baseline, time_tolerance=0.25, memory_tolerance=0.10, min_seconds=0.002):
+    """
+    Check current results against a baseline document.
+    Returns a list of regression messages (empty if everything is within
+    tolerance). Stage timings under `min_seconds` are too noisy to gate on.
+    """
+    previous = {(r['duration_minutes'], r['stage']): r for r in baseline['results']}
+    regressions = []
+    for r in current['results']:
+        key = (r['duration_minutes'], r['stage'])
+        if key not in previous:
+            continue
+        old = previous[key]
+
+        if r['median_s'] > old['median_s'] * (1 + time_tolerance) and r['median_s'] - old['median_s'] > min_seconds:
+            regressions.append(
+                f"{r['stage']} @ {r['duration_minutes']} min: "
+                f"{old['median_s'] * 1000:.2f} ms -> {r['median_s'] * 1000:.2f} ms"
+            )
+        if r['peak_kb'] > old['peak_kb'] * (1 + memory_tolerance) and r['peak_kb'] - old['peak_kb'] > 64:
+            regressions.append(
+                f"{r['stage']} @ {r['duration_minutes']} min: "
+                f"peak {old['peak_kb']:.0f} KB -> {r['peak_kb']:.0f} KB"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the VibeChapters pipeline offline")
+    parser.add_argument("--durations", type=int, nargs="+", default=list(DEFAULT_DURATIONS),
+                        help="Synthetic video lengths in minutes")
+    parser.add_argument("--max-words", type=int, default=100, help="Words per chapter")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage")
+    parser.add_argument("-o", "--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline results file to check for regressions")
+    parser.add_argument("--time-tolerance", type=float, default=0.25,
+                        help="Allowed slowdown per stage (0.25 = 25%%)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.10,
+                        help="Allowed peak memory growth per stage")
+    args = parser.parse_args(argv)
+
+    document = run_benchmarks(args.durations, max_words=args.max_words, repeat=args.repeat)
+    print_results(document)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(
+            document, baseline,
+            time_tolerance=args.time_tolerance,
+            memory_tolerance=args.memory_tolerance,
+        )
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) vs {args.compare}:")
+            for message in regressions:
+                print(f"   - {message}")
+            return 1
+        print(f"✅ No regressions vs {args.compare}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Default on-disk cache location (override with VIBECHAPTERS_CACHE_DIR)
+DEFAULT_CACHE_DIR = os.getenv("VIBECHAPTERS_CACHE_DIR", ".vibechapters_cache")
+
+# Transcript cache limits
+TRANSCRIPT_TTL_SECONDS = int(os.getenv("TRANSCRIPT_CACHE_TTL", 7 * 24 * 3600))
+TRANSCRIPT_NEGATIVE_TTL_SECONDS = int(os.getenv("TRANSCRIPT_CACHE_NEGATIVE_TTL", 6 * 3600))
+TRANSCRIPT_MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+
+# Title cache limits
+TITLE_MEMORY_ENTRIES = int(os.getenv("TITLE_CACHE_MEMORY_ENTRIES", 4096))
+TITLE_DISK_ENTRIES = int(os.getenv("TITLE_CACHE_DISK_ENTRIES", 200000))
+
+
+def _connect(path):
+    """Open a SQLite connection that is safe to share between Streamlit threads"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class TranscriptCache:
+    """
+    On-disk transcript store keyed by video_id + language.
+
+    Entries expire after a TTL and the store is kept under a byte budget by
+    evicting the least recently accessed entries. Videos without captions are
+    remembered as negative entries (with a shorter TTL) so we don't keep
+    hammering YouTube for them.
+    """
+
+    def __init__(self, path=None, ttl=TRANSCRIPT_TTL_SECONDS,
+                 negative_ttl=TRANSCRIPT_NEGATIVE_TTL_SECONDS, max_bytes=TRANSCRIPT_MAX_BYTES):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "transcripts.sqlite3")
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = _connect(self.path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS transcripts (
+                video_id TEXT NOT NULL,
+                language TEXT NOT NULL,
+                payload TEXT,
+                negative INTEGER NOT NULL DEFAULT 0,
+                size INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (video_id, language)
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_transcripts_accessed ON transcripts (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, video_id, language="en"):
+        """
+        Look up a cached transcript.
+
+        Returns (text, transcript_data) on a hit, ("", []) for a cached
+        "no captions" entry and None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, negative, created_at FROM transcripts WHERE video_id = ? AND language = ?",
+                (video_id, language)
+            ).fetchone()
+            if row is None:
+                return None
+
+            payload, negative, created_at = row
+            ttl = self.negative_ttl if negative else self.ttl
+            if now - created_at > ttl:
+                self._conn.execute(
+                    "DELETE FROM transcripts WHERE video_id = ? AND language = ?",
+                    (video_id, language)
+                )
+                self._conn.commit()
+                return None
+
+            self._conn.execute(
+                "UPDATE transcripts SET accessed_at = ? WHERE video_id = ? AND language = ?",
+                (now, video_id, language)
+            )
+            self._conn.commit()
+
+        if negative:
+            return "", []
+        data = json.loads(payload)
+        return data["text"], data["transcript"]
+
+    def put(self, video_id, text, transcript_data, language="en"):
+        """
+        Store a fetched transcript and evict old entries if over budget.
+        transcript_data must be JSON-serializable (e.g. Transcript.to_dict()).
+        """
+        payload = json.dumps({"text": text, "transcript": transcript_data}, ensure_ascii=False)
+        self._store(video_id, language, payload, negative=False)
+
+    def put_negative(self, video_id, language="en"):
+        """Remember that a video has no usable captions"""
+        self._store(video_id, language, None, negative=True)
+
+    def _store(self, video_id, language, payload, negative):
+        now = time.time()
+        size = len(payload.encode("utf-8")) if payload else 0
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcripts "
+                "(video_id, language, payload, negative, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (video_id, language, payload, int(negative), size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop least recently used entries until the store fits in max_bytes"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._conn.execute(
+            "SELECT video_id, language, size FROM transcripts ORDER BY accessed_at ASC"
+        ).fetchall()
+        for video_id, language, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute(
+                "DELETE FROM transcripts WHERE video_id = ? AND language = ?",
+                (video_id, language)
+            )
+            total -= size
+
+    def clear(self):
+        """Remove every cached transcript"""
+        with self._lock:
+            self._conn.execute("DELETE FROM transcripts")
+            self._conn.commit()
+
+
+_transcript_cache = None
+_transcript_cache_lock = threading.Lock()
+
+
+def get_transcript_cache():
+    """Return the process-wide transcript cache, or None if it can't be opened"""
+    global _transcript_cache
+    with _transcript_cache_lock:
+        if _transcript_cache is None:
+            try:
+                _transcript_cache = TranscriptCache()
+            except Exception as e:
+                print(f"⚠️ Transcript cache unavailable: {e}")
+                return None
+        return _transcript_cache
+
+
+def title_cache_key(chunk, mode, prompt_version):
+    """Hash of the normalized chunk text plus everything that changes the title"""
+    normalized = " ".join(chunk.lower().split())
+    digest = hashlib.sha256()
+    digest.update(f"{mode}\x00{prompt_version}\x00".encode("utf-8"))
+    digest.update(normalized.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class TitleCache:
+    """
+    Two-tier chapter title cache: an in-process LRU in front of SQLite.
+
+    Keys come from title_cache_key(), so identical chunks in reruns or in
+    other videos map to the same entry. Hit/miss counters are kept per tier.
+    """
+
+    def __init__(self, path=None, memory_entries=TITLE_MEMORY_ENTRIES, disk_entries=TITLE_DISK_ENTRIES):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "titles.sqlite3")
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._conn = _connect(self.path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS titles (
+                key TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_titles_accessed ON titles (accessed_at)")
+        self._conn.commit()
+
+    def _remember(self, key, title):
+        self._memory[key] = title
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached title for key, or None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+            row = self._conn.execute("SELECT title FROM titles WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE titles SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.disk_hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, key, title):
+        """Store a title in both tiers"""
+        with self._lock:
+            self._remember(key, title)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO titles (key, title, accessed_at) VALUES (?, ?, ?)",
+                (key, title, time.time())
+            )
+            self._writes += 1
+            # Trimming the disk tier is a full scan, so only do it occasionally
+            if self._writes % 1000 == 0:
+                self._trim_disk()
+            self._conn.commit()
+
+    def _trim_disk(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM titles").fetchone()[0]
+        if count > self.disk_entries:
+            self._conn.execute(
+                "DELETE FROM titles WHERE key IN "
+                "(SELECT key FROM titles ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.disk_entries,)
+            )
+
+    def stats(self):
+        """Hit/miss counters for both tiers"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def clear(self):
+        """Drop every cached title"""
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM titles")
+            self._conn.commit()
+
+
+_title_cache = None
+_title_cache_lock = threading.Lock()
+
+
+def get_title_cache():
+    """Return the process-wide title cache, or None if it can't be opened"""
+    global _title_cache
+    with _title_cache_lock:
+        if _title_cache is None:
+            try:
+                _title_cache = TitleCache()
+            except Exception as e:
+                print(f"⚠️ Title cache unavailable: {e}")
+                return None
+        return _title_cache
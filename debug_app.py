@@ -1,6 +1,6 @@
 import streamlit as st
 from get_transcript import get_demo_transcript
-from split_text import split_text
+from split_text import split_text, split_transcript
 from summarize import summarize_chunk, get_summarization_status
 import time
 
@@ -30,7 +30,8 @@ if st.button("🎬 Test Demo Mode"):
             st.text(text[:300] + "...")
         
         st.write("**Step 2: Splitting into chunks...**")
-        chunks = split_text(text, max_words=100)
+        chapters = list(split_transcript(transcript, max_words=100))
+        chunks = [chapter['text'] for chapter in chapters]
         st.success(f"✅ Created {len(chunks)} chunks")
         
         # Show chunk preview
@@ -63,7 +64,7 @@ if st.button("🎬 Test Demo Mode"):
             st.success(f"🎉 Generated {len(chapter_titles)} chapter titles!")
             
             for i, (title, chunk) in enumerate(zip(chapter_titles, chunks)):
-                start_time = transcript[i * 100]['start'] if i * 100 < len(transcript) else 0
+                start_time = chapters[i]['start']
                 minutes, seconds = divmod(int(start_time), 60)
                 
                 st.markdown(f"**{i+1}. {title}**")
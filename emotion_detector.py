@@ -1,57 +1,448 @@
 import re
-from textblob import TextBlob
+import heapq
+import bisect
+import threading
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from transformers import pipeline
+from split_text import build_word_offsets, segment_for_word
+import metrics
 
-class EmotionDetector:
+EMOTION_MODEL = "j-hartmann/emotion-english-distilroberta-base"
+
+# Transformer labels mapped to our emotion categories
+_LABEL_MAP = {
+    'joy': 'joy', 'happiness': 'joy',
+    'surprise': 'surprise',
+    'anger': 'anger',
+    'disgust': 'disgust',
+    'sadness': 'sadness',
+    'fear': 'fear',
+    'neutral': 'neutral',
+}
+
+# Inference backends for the transformer model
+BACKENDS = ('pytorch', 'quantized', 'onnx')
+
+# Process-wide classifiers (one per backend), loaded on first use
+_emotion_classifiers = {}
+_failed_backends = set()
+_emotion_classifier_lock = threading.Lock()
+
+def _load_pipeline(backend):
+    """Build the emotion pipeline for the given inference backend"""
+    from transformers import pipeline
+    
+    if backend == 'pytorch':
+        return pipeline(
+            "text-classification", 
+            model=EMOTION_MODEL,
+            device=-1,  # Use CPU
+            top_k=None  # Return scores for every label
+        )
+    
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(EMOTION_MODEL)
+    
+    if backend == 'quantized':
+        # Dynamic int8 quantization of the Linear layers (CPU only)
+        import torch
+        from transformers import AutoModelForSequenceClassification
+        model = AutoModelForSequenceClassification.from_pretrained(EMOTION_MODEL)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif backend == 'onnx':
+        # Requires: pip install optimum[onnxruntime]
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        model = ORTModelForSequenceClassification.from_pretrained(EMOTION_MODEL, export=True)
+    else:
+        raise ValueError(f"Unknown emotion backend: {backend}")
+    
+    return pipeline("text-classification", model=model, tokenizer=tokenizer, device=-1, top_k=None)
+
+def get_emotion_classifier(backend='pytorch'):
+    """Return the shared emotion pipeline for a backend, loading it on first use (None if unavailable)"""
+    with _emotion_classifier_lock:
+        if backend not in _emotion_classifiers and backend not in _failed_backends:
+            try:
+                _emotion_classifiers[backend] = _load_pipeline(backend)
+            except Exception as e:
+                print(f"Transformer model ({backend}) failed to load: {str(e)[:100]}")
+                _failed_backends.add(backend)
+        return _emotion_classifiers.get(backend)
+
+# Keyword lists for the lexicon fallback (matched as whole words)
+_EXCITEMENT_WORDS = ('amazing', 'incredible', 'wow', 'awesome', 'fantastic', 
+                     'brilliant', 'outstanding', 'remarkable', 'extraordinary')
+_SURPRISE_WORDS = ('surprising', 'unexpected', 'shocking', 'unbelievable', 
+                   'astonishing', 'sudden')
+_JOY_WORDS = ('happy', 'joy', 'excited', 'thrilled', 'delighted', 'pleased')
+
+# Used when TextBlob's sentiment lexicon isn't installed: word -> (polarity, subjectivity)
+_BUILTIN_SENTIMENT = {
+    'good': (0.7, 0.6), 'great': (0.8, 0.75), 'amazing': (0.6, 0.9), 'awesome': (1.0, 1.0),
+    'fantastic': (0.4, 0.9), 'brilliant': (0.9, 1.0), 'incredible': (0.9, 0.9),
+    'excellent': (1.0, 1.0), 'happy': (0.8, 1.0), 'love': (0.5, 0.6), 'best': (1.0, 0.3),
+    'nice': (0.6, 1.0), 'wonderful': (1.0, 1.0), 'exciting': (0.3, 0.8), 'interesting': (0.5, 0.5),
+    'bad': (-0.7, 0.67), 'terrible': (-1.0, 1.0), 'awful': (-1.0, 1.0), 'worst': (-1.0, 1.0),
+    'sad': (-0.5, 1.0), 'hate': (-0.8, 0.9), 'boring': (-1.0, 1.0), 'difficult': (-0.5, 1.0),
+    'wrong': (-0.5, 0.9), 'poor': (-0.4, 0.6), 'problem': (-0.2, 0.4), 'angry': (-0.5, 1.0),
+}
+
+# Adverbs that modify the next sentiment word: word -> (polarity, subjectivity, intensity)
+_BUILTIN_MODIFIERS = {
+    'very': (0.2, 0.3, 1.3), 'really': (0.2, 0.2, 1.0), 'absolutely': (0.2, 0.9, 1.0),
+    'extremely': (-0.125, 1.0, 1.0), 'incredibly': (0.9, 0.9, 1.0), 'totally': (0.0, 0.75, 1.0),
+}
+
+# Flip and soften the next sentiment word, as TextBlob does ("not good" is slightly bad)
+_NEGATIONS = frozenset(('no', 'not', 'never', 'cannot'))
+NEGATION_FACTOR = -0.5
+
+LEXICON_EMOTIONS = ('joy', 'excitement', 'surprise', 'neutral')
+
+_TOKEN_RE = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+class _SentimentLexicon:
+    """Vocabulary index with polarity/subjectivity/modifier and keyword-category arrays"""
+    
     def __init__(self):
-        # Load emotion detection model (lightweight)
+        sentiment = self._load_sentiment()
+        words = set(sentiment) | set(_EXCITEMENT_WORDS) | set(_SURPRISE_WORDS) | set(_JOY_WORDS)
+        self.index = {word: i for i, word in enumerate(sorted(words))}
+        
+        size = len(self.index)
+        self.polarity = np.zeros(size, dtype=np.float32)
+        self.subjectivity = np.zeros(size, dtype=np.float32)
+        self.intensity = np.ones(size, dtype=np.float32)
+        self.modifier = np.zeros(size, dtype=bool)
+        for word, (polarity, subjectivity, intensity, modifier) in sentiment.items():
+            self.polarity[self.index[word]] = polarity
+            self.subjectivity[self.index[word]] = subjectivity
+            self.intensity[self.index[word]] = intensity
+            self.modifier[self.index[word]] = modifier
+        self.rated = (self.polarity != 0) | (self.subjectivity != 0)
+        
+        # Columns: excitement, surprise, joy keyword membership
+        self.categories = np.zeros((size, 3), dtype=np.float32)
+        for column, category_words in enumerate((_EXCITEMENT_WORDS, _SURPRISE_WORDS, _JOY_WORDS)):
+            for word in category_words:
+                self.categories[self.index[word], column] = 1
+    
+    @staticmethod
+    def _load_sentiment():
+        """
+        Single-word (polarity, subjectivity, intensity, is_modifier) from
+        TextBlob's lexicon if installed; adverbs (RB) modify the next word.
+        """
         try:
-            self.emotion_classifier = pipeline(
-                "text-classification", 
-                model="j-hartmann/emotion-english-distilroberta-base",
-                device=-1  # Use CPU
-            )
-            self.use_transformer = True
-        except:
-            print("Transformer model failed to load, using TextBlob fallback")
-            self.use_transformer = False
+            from textblob.en import sentiment as textblob_sentiment
+            textblob_sentiment.load()
+            lexicon = {}
+            for word, senses in textblob_sentiment.items():
+                scores = senses.get(None)
+                if scores and ' ' not in word and word.isalpha():
+                    lexicon[word.lower()] = (scores[0], scores[1], scores[2], 'RB' in senses)
+            if lexicon:
+                return lexicon
+        except Exception:
+            pass
+        lexicon = {word: (polarity, subjectivity, 1.0, False)
+                   for word, (polarity, subjectivity) in _BUILTIN_SENTIMENT.items()}
+        for word, (polarity, subjectivity, intensity) in _BUILTIN_MODIFIERS.items():
+            lexicon[word] = (polarity, subjectivity, intensity, True)
+        return lexicon
+
+_lexicon = None
+_lexicon_lock = threading.Lock()
+
+def _get_lexicon():
+    global _lexicon
+    with _lexicon_lock:
+        if _lexicon is None:
+            _lexicon = _SentimentLexicon()
+        return _lexicon
+
+def _shifted(values, docs, offset, fill):
+    """values moved by `offset` tokens (positive = previous token) without crossing chunks"""
+    out = np.full(len(values), fill, dtype=values.dtype)
+    if 0 < abs(offset) < len(values):
+        if offset > 0:
+            same = docs[offset:] == docs[:-offset]
+            out[offset:] = np.where(same, values[:-offset], fill)
+        else:
+            same = docs[:offset] == docs[-offset:]
+            out[:offset] = np.where(same, values[-offset:], fill)
+    return out
+
+def score_lexicon_emotions(chunks):
+    """
+    Lexicon-based emotion scores for every chunk at once.
+    
+    All chunks are tokenized once into (chunk, word id) arrays; polarity and
+    subjectivity are averaged over sentiment-bearing words and keyword hits
+    use whole-word matches (each keyword counted once per chunk). Like
+    TextBlob, a preceding adverb ("very good") scales a word by its intensity
+    and is folded into it, and a preceding negation ("not good", "isn't a
+    good") multiplies its polarity by -0.5. Modifiers and negations only
+    look back one or two tokens, so long chains can differ slightly from
+    TextBlob. Returns an (n_chunks, 4) float array with columns LEXICON_EMOTIONS.
+    """
+    lexicon = _get_lexicon()
+    index = lexicon.index
+    n_chunks = len(chunks)
+    
+    # Every token in order, as ids into this call's vocabulary
+    token_lists = [_TOKEN_RE.findall(chunk.lower()) for chunk in chunks]
+    docs = np.repeat(np.arange(n_chunks, dtype=np.int64), [len(tokens) for tokens in token_lists])
+    all_tokens = list(chain.from_iterable(token_lists))
+    vocabulary = {token: i for i, token in enumerate(dict.fromkeys(all_tokens))}
+    token_ids = np.fromiter(map(vocabulary.__getitem__, all_tokens), dtype=np.int64, count=len(all_tokens))
+    
+    # Per-vocabulary lookups, expanded to every token
+    tokens = np.array([index.get(token, -1) for token in vocabulary], dtype=np.int64)[token_ids]
+    negation = np.array([token in _NEGATIONS or token.endswith("n't") for token in vocabulary], dtype=bool)[token_ids]
+    short = np.array([len(token) == 1 for token in vocabulary], dtype=bool)[token_ids]
+    known = tokens >= 0
+    lookup = np.where(known, tokens, 0)
+    
+    rated = known & lexicon.rated[lookup]
+    modifier = rated & lexicon.modifier[lookup]
+    word_polarity = np.where(rated, lexicon.polarity[lookup], 0).astype(np.float64)
+    word_subjectivity = np.where(rated, lexicon.subjectivity[lookup], 0).astype(np.float64)
+    
+    # "very good": scale by the preceding modifier's intensity
+    previous_modifier = _shifted(modifier, docs, 1, False)
+    previous_intensity = _shifted(np.where(rated, lexicon.intensity[lookup], 1).astype(np.float64), docs, 1, 1.0)
+    boosted = rated & previous_modifier
+    word_polarity = np.where(boosted, np.clip(word_polarity * previous_intensity, -1, 1), word_polarity)
+    word_subjectivity = np.where(boosted, np.clip(word_subjectivity * previous_intensity, -1, 1), word_subjectivity)
+    
+    # ...and the modifier itself isn't scored on its own ("really not good" included)
+    next_rated = _shifted(rated, docs, -1, False)
+    next_negation = _shifted(negation, docs, -1, False)
+    absorbed = modifier & (next_rated | (next_negation & _shifted(rated, docs, -2, False)))
+    
+    # "not good", "not a good", "not very good": flip and soften polarity
+    skippable = short | modifier
+    negated = rated & (
+        _shifted(negation, docs, 1, False)
+        | (_shifted(skippable, docs, 1, False) & _shifted(negation, docs, 2, False))
+    )
+    word_polarity = np.where(negated, word_polarity * NEGATION_FACTOR, word_polarity)
+    
+    # Average polarity/subjectivity over the sentiment-bearing words of each chunk
+    scored = (rated & ~absorbed).astype(np.float64)
+    scored_counts = np.bincount(docs, weights=scored, minlength=n_chunks)
+    denominator = np.maximum(scored_counts, 1)
+    polarity = np.bincount(docs, weights=word_polarity * scored, minlength=n_chunks) / denominator
+    subjectivity = np.bincount(docs, weights=word_subjectivity * scored, minlength=n_chunks) / denominator
+    
+    # Distinct keyword hits per chunk and category
+    docs, words = docs[known], tokens[known]
+    cells = np.unique(docs * len(index) + words)
+    cell_docs, cell_words = np.divmod(cells, len(index))
+    hits = np.zeros((n_chunks, 3), dtype=np.float64)
+    np.add.at(hits, cell_docs, lexicon.categories[cell_words])
+    excitement_count, surprise_count, joy_count = hits.T
+    
+    scores = np.empty((n_chunks, 4), dtype=np.float64)
+    scores[:, 0] = np.minimum(1.0, (polarity + 1) / 2 + joy_count * 0.1)
+    scores[:, 1] = np.minimum(1.0, excitement_count * 0.2 + np.maximum(0, polarity) * 0.5)
+    scores[:, 2] = np.minimum(1.0, surprise_count * 0.3 + subjectivity * 0.2)
+    scores[:, 3] = np.maximum(0, 1 - np.abs(polarity))
+    return scores
+
+# Highlight detection defaults: excitement is smoothed over about this many
+# neighbouring chunks, so the window scales with the words-per-chapter setting
+HIGHLIGHT_WINDOW_CHUNKS = 3
+HIGHLIGHT_MIN_GAP_SECONDS = 60
+
+def highlight_window(timestamps, window_chunks=HIGHLIGHT_WINDOW_CHUNKS):
+    """Smoothing window in seconds covering `window_chunks` chunks at their median spacing"""
+    if len(timestamps) < 2:
+        return 0.0
+    spacing = np.median(np.diff(np.sort(np.asarray(timestamps, dtype=np.float64))))
+    return float(window_chunks * spacing)
+
+def smooth_excitement(timestamps, scores, window_seconds):
+    """
+    Mean score within +/- window_seconds / 2 of each point.
+    Timestamps must be ascending; uses prefix sums, so O(n log n) overall.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float64)
+    prefix = np.concatenate(([0.0], np.cumsum(scores)))
+    half = window_seconds / 2.0
+    lo = np.searchsorted(timestamps, timestamps - half, side='left')
+    hi = np.searchsorted(timestamps, timestamps + half, side='right')
+    return (prefix[hi] - prefix[lo]) / (hi - lo)
+
+def _iter_by_score(scores):
+    """Indices in descending score order, popped lazily from a heap"""
+    heap = [(-score, i) for i, score in enumerate(scores)]
+    heapq.heapify(heap)
+    while heap:
+        yield heapq.heappop(heap)[1]
+
+def _select_with_gap(candidates, timestamps, top_n, min_gap_seconds):
+    """Greedy non-maximum suppression: keep candidates at least min_gap_seconds apart"""
+    accepted_times = []
+    chosen = []
+    if top_n <= 0:
+        return chosen
+    for i in candidates:
+        timestamp = timestamps[i]
+        position = bisect.bisect_left(accepted_times, timestamp)
+        if position > 0 and timestamp - accepted_times[position - 1] < min_gap_seconds:
+            continue
+        if position < len(accepted_times) and accepted_times[position] - timestamp < min_gap_seconds:
+            continue
+        accepted_times.insert(position, timestamp)
+        chosen.append(i)
+        if len(chosen) == top_n:
+            break
+    return chosen
+
+def _highlight_entry(chunk, smoothed_score):
+    # Get dominant emotion
+    emotions = chunk['emotions']
+    dominant_emotion = max(emotions.items(), key=lambda x: x[1])
+    
+    return {
+        'timestamp': chunk['timestamp'],
+        'excitement_score': chunk['excitement_score'],
+        'smoothed_score': float(smoothed_score),
+        'dominant_emotion': dominant_emotion[0],
+        'emotion_strength': dominant_emotion[1],
+        'preview': chunk['text_preview'],
+        'chunk_index': chunk['chunk_index']
+    }
+
+class HighlightTracker:
+    """
+    Incremental highlight detection for chunk emotions arriving in time order.
+    
+    A chunk's smoothed score is final once a chunk past the end of its window
+    arrives; final scores go into a bounded min-heap, so each chunk costs
+    O(log k) and memory for candidates stays O(k). Without window_seconds,
+    the window is set from the spacing of the first two chunks.
+    """
+    
+    def __init__(self, top_n=5, window_seconds=None,
+                 min_gap_seconds=HIGHLIGHT_MIN_GAP_SECONDS, capacity=None):
+        self.top_n = top_n
+        self.window_seconds = window_seconds
+        self.min_gap_seconds = min_gap_seconds
+        # Extra room so suppression still leaves top_n highlights
+        self.capacity = capacity or top_n * 8
+        self._times = []
+        self._prefix = [0.0]
+        self._chunks = {}
+        self._next_pending = 0
+        self._heap = []
+    
+    def add(self, chunk_emotion):
+        """Feed the next chunk (timestamps must not decrease)"""
+        timestamp = float(chunk_emotion['timestamp'])
+        index = len(self._times)
+        self._times.append(timestamp)
+        self._prefix.append(self._prefix[-1] + chunk_emotion['excitement_score'])
+        self._chunks[index] = chunk_emotion
+        if self.window_seconds is None and index == 1:
+            self.window_seconds = highlight_window(self._times)
+        
+        half = (self.window_seconds or 0.0) / 2.0
+        while self._next_pending < index and self._times[self._next_pending] + half < timestamp:
+            self._finalize(self._next_pending)
+            self._next_pending += 1
+    
+    def _smoothed(self, index):
+        half = (self.window_seconds or 0.0) / 2.0
+        timestamp = self._times[index]
+        lo = bisect.bisect_left(self._times, timestamp - half)
+        hi = bisect.bisect_right(self._times, timestamp + half)
+        return (self._prefix[hi] - self._prefix[lo]) / (hi - lo)
+    
+    def _finalize(self, index):
+        # Ties go to the earlier chunk, as in find_highlights, so the later one is evicted first
+        entry = (self._smoothed(index), -index)
+        if len(self._heap) < self.capacity:
+            heapq.heappush(self._heap, entry)
+        else:
+            entry = heapq.heappushpop(self._heap, entry)
+            # Whatever fell out of the heap can never be a highlight
+            del self._chunks[-entry[1]]
+    
+    def highlights(self):
+        """Current top highlights, including chunks whose window is still open"""
+        candidates = [(score, -negative_index) for score, negative_index in self._heap]
+        candidates.extend(
+            (self._smoothed(i), i) for i in range(self._next_pending, len(self._times))
+        )
+        # Highest score first, earliest chunk first on ties (same order as _iter_by_score)
+        candidates.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+        
+        smoothed = {i: score for score, i in candidates}
+        timestamps = {i: self._times[i] for _, i in candidates}
+        chosen = _select_with_gap((i for _, i in candidates), timestamps, self.top_n, self.min_gap_seconds)
+        return [_highlight_entry(self._chunks[i], smoothed[i]) for i in chosen]
+
+class EmotionDetector:
+    def __init__(self, batch_size=16, max_length=512, num_workers=1, use_transformer=True, backend='pytorch'):
+        """
+        The transformer model is loaded lazily and shared by every detector.
+        Chunks are classified in batches of `batch_size`, truncated to
+        `max_length` tokens; num_workers > 1 runs batches on a thread pool.
+        `backend` picks 'pytorch', 'quantized' (dynamic int8) or 'onnx'
+        (ONNX Runtime); if it can't load, the PyTorch model is used, and
+        TextBlob if that fails too.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown emotion backend: {backend}")
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.num_workers = num_workers
+        self.backend = backend
+        self._transformer_requested = use_transformer
+    
+    @property
+    def emotion_classifier(self):
+        if not self._transformer_requested:
+            return None
+        classifier = get_emotion_classifier(self.backend)
+        if classifier is None and self.backend != 'pytorch':
+            classifier = get_emotion_classifier('pytorch')
+        return classifier
     
-    def detect_emotions_in_chunks(self, chunks, transcript_data):
-        """Detect emotions for each chunk and find emotional peaks"""
+    @property
+    def use_transformer(self):
+        return self.emotion_classifier is not None
+    
+    def detect_emotions_in_chunks(self, chunks, transcript_data, chunk_word_starts=None):
+        """
+        Detect emotions for each chunk and find emotional peaks.
+        
+        `chunks` can be chunk dicts from split_transcript (their 'start' is
+        used as the timestamp) or plain strings. For strings, each chunk's
+        first word is located in the transcript by binary search over its
+        word offsets; pass chunk_word_starts if the chunks don't cover the
+        transcript's words back to back.
+        """
         chunk_emotions = []
+        texts = [chunk['text'] if isinstance(chunk, dict) else chunk for chunk in chunks]
+        timestamps = self._chunk_timestamps(chunks, texts, transcript_data, chunk_word_starts)
         
-        for i, chunk in enumerate(chunks):
-            if self.use_transformer:
+        use_transformer = self.use_transformer
+        with metrics.span("emotion_scoring", backend=self.backend if use_transformer else "lexicon") as span:
+            span.set(chunks=len(texts))
+            if use_transformer:
                 # Use transformer model for better emotion detection
-                emotions = self.emotion_classifier(chunk[:512])  # Limit text length
-                emotion_scores = {
-                    'joy': 0, 'excitement': 0, 'surprise': 0, 
-                    'anger': 0, 'sadness': 0, 'fear': 0, 'neutral': 0
-                }
-                
-                for emotion in emotions:
-                    label = emotion['label'].lower()
-                    score = emotion['score']
-                    
-                    # Map transformer labels to our categories
-                    if label in ['joy', 'happiness']:
-                        emotion_scores['joy'] = score
-                    elif label in ['surprise']:
-                        emotion_scores['surprise'] = score
-                    elif label in ['anger']:
-                        emotion_scores['anger'] = score
-                    elif label in ['sadness']:
-                        emotion_scores['sadness'] = score
-                    elif label in ['fear']:
-                        emotion_scores['fear'] = score
-                    else:
-                        emotion_scores['neutral'] = score
-                
+                all_scores = self._classify_chunks(texts)
             else:
-                # Fallback: Use TextBlob + keyword matching
-                emotion_scores = self._analyze_with_textblob(chunk)
-            
+                # Fallback: sentiment lexicon + keyword matching
+                all_scores = self._analyze_with_lexicon(texts)
+        
+        for i, (chunk, emotion_scores) in enumerate(zip(texts, all_scores)):
             # Calculate excitement score (combination of positive emotions)
             excitement_score = (
                 emotion_scores.get('joy', 0) * 0.4 +
@@ -59,12 +450,9 @@ class EmotionDetector:
                 emotion_scores.get('excitement', 0) * 0.3
             )
             
-            # Get timestamp for this chunk
-            timestamp = transcript_data[i * 100]['start'] if i * 100 < len(transcript_data) else 0
-            
             chunk_emotions.append({
                 'chunk_index': i,
-                'timestamp': timestamp,
+                'timestamp': timestamps[i],
                 'emotions': emotion_scores,
                 'excitement_score': excitement_score,
                 'text_preview': chunk[:100] + "..." if len(chunk) > 100 else chunk
@@ -72,64 +460,254 @@ class EmotionDetector:
         
         return chunk_emotions
     
-    def _analyze_with_textblob(self, text):
-        """Fallback emotion analysis using TextBlob and keywords"""
-        blob = TextBlob(text)
-        polarity = blob.sentiment.polarity
-        subjectivity = blob.sentiment.subjectivity
-        
-        # Keyword-based emotion detection
-        excitement_words = ['amazing', 'incredible', 'wow', 'awesome', 'fantastic', 
-                          'brilliant', 'outstanding', 'remarkable', 'extraordinary']
-        surprise_words = ['surprising', 'unexpected', 'shocking', 'unbelievable', 
-                         'astonishing', 'sudden', 'sudden']
-        joy_words = ['happy', 'joy', 'excited', 'thrilled', 'delighted', 'pleased']
-        
-        text_lower = text.lower()
-        
-        excitement_count = sum(1 for word in excitement_words if word in text_lower)
-        surprise_count = sum(1 for word in surprise_words if word in text_lower)
-        joy_count = sum(1 for word in joy_words if word in text_lower)
-        
-        return {
-            'joy': min(1.0, (polarity + 1) / 2 + joy_count * 0.1),
-            'excitement': min(1.0, excitement_count * 0.2 + max(0, polarity) * 0.5),
-            'surprise': min(1.0, surprise_count * 0.3 + subjectivity * 0.2),
-            'neutral': max(0, 1 - abs(polarity))
+    def _chunk_timestamps(self, chunks, texts, transcript_data, chunk_word_starts=None):
+        """Start time of every chunk, resolved against the transcript in O(log n) each"""
+        if chunks and all(isinstance(chunk, dict) and 'start' in chunk for chunk in chunks):
+            return [float(chunk['start']) for chunk in chunks]
+        
+        if not len(transcript_data):
+            return [0.0] * len(texts)
+        
+        if chunk_word_starts is None:
+            # Chunks from split_text cover the words back to back
+            chunk_word_starts = []
+            word_index = 0
+            for text in texts:
+                chunk_word_starts.append(word_index)
+                word_index += len(text.split())
+        
+        offsets = build_word_offsets(transcript_data)
+        timestamps = []
+        for word_index in chunk_word_starts:
+            segment = min(segment_for_word(offsets, word_index), len(transcript_data) - 1)
+            timestamps.append(float(transcript_data[segment]['start']))
+        return timestamps
+    
+    def _classify_chunks(self, chunks):
+        """Run the transformer over all chunks in batches, keeping chunk order"""
+        classifier = self.emotion_classifier
+        batches = [chunks[i:i + self.batch_size] for i in range(0, len(chunks), self.batch_size)]
+        
+        def classify(batch):
+            return classifier(
+                list(batch),
+                batch_size=self.batch_size,
+                truncation=True,
+                max_length=self.max_length,
+            )
+        
+        if self.num_workers > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+                results = list(pool.map(classify, batches))
+        else:
+            results = [classify(batch) for batch in batches]
+        
+        return [
+            self._map_labels(labels)
+            for batch_result in results
+            for labels in batch_result
+        ]
+    
+    def _map_labels(self, labels):
+        """Turn the pipeline's [{'label', 'score'}, ...] into our emotion scores"""
+        emotion_scores = {
+            'joy': 0, 'excitement': 0, 'surprise': 0, 
+            'anger': 0, 'disgust': 0, 'sadness': 0, 'fear': 0, 'neutral': 0
         }
+        # A single dict comes back when only the top label is returned
+        if isinstance(labels, dict):
+            labels = [labels]
+        
+        for emotion in labels:
+            category = _LABEL_MAP.get(emotion['label'].lower())
+            if category:
+                emotion_scores[category] = max(emotion_scores.get(category, 0), emotion['score'])
+        
+        return emotion_scores
+    
+    def _analyze_with_textblob(self, text):
+        """Fallback emotion analysis for a single chunk (see score_lexicon_emotions)"""
+        return self._analyze_with_lexicon([text])[0]
     
-    def find_highlights(self, chunk_emotions, top_n=5):
-        """Find the most exciting/emotional moments"""
-        # Sort by excitement score
-        sorted_chunks = sorted(chunk_emotions, key=lambda x: x['excitement_score'], reverse=True)
+    def _analyze_with_lexicon(self, chunks):
+        """Fallback emotion analysis for many chunks in one vectorized pass"""
+        matrix = score_lexicon_emotions(chunks)
+        return [
+            dict(zip(LEXICON_EMOTIONS, row))
+            for row in matrix.tolist()
+        ]
+    
+    def find_highlights(self, chunk_emotions, top_n=5, window_seconds=None,
+                        min_gap_seconds=HIGHLIGHT_MIN_GAP_SECONDS):
+        """
+        Find the most exciting/emotional moments.
+        Excitement is smoothed over a sliding time window (by default about
+        HIGHLIGHT_WINDOW_CHUNKS chunks wide), and highlights closer than
+        min_gap_seconds to a better one are suppressed.
+        """
+        if not chunk_emotions or top_n <= 0:
+            return []
         
-        highlights = []
-        for chunk in sorted_chunks[:top_n]:
-            # Get dominant emotion
-            emotions = chunk['emotions']
-            dominant_emotion = max(emotions.items(), key=lambda x: x[1])
+        with metrics.span("emotion_highlights"):
+            timestamps = np.array([chunk['timestamp'] for chunk in chunk_emotions], dtype=np.float64)
+            scores = np.array([chunk['excitement_score'] for chunk in chunk_emotions], dtype=np.float64)
             
-            highlights.append({
-                'timestamp': chunk['timestamp'],
-                'excitement_score': chunk['excitement_score'],
-                'dominant_emotion': dominant_emotion[0],
-                'emotion_strength': dominant_emotion[1],
-                'preview': chunk['text_preview'],
-                'chunk_index': chunk['chunk_index']
-            })
+            if window_seconds is None:
+                window_seconds = highlight_window(timestamps)
+            order = np.argsort(timestamps, kind='stable')
+            smoothed = np.empty_like(scores)
+            smoothed[order] = smooth_excitement(timestamps[order], scores[order], window_seconds)
+            
+            chosen = _select_with_gap(_iter_by_score(smoothed), timestamps, top_n, min_gap_seconds)
+            return [_highlight_entry(chunk_emotions[i], smoothed[i]) for i in chosen]
+    
+    def get_emotion_timeline(self, chunk_emotions, max_points=None, method='lttb'):
+        """
+        Create data for emotion timeline visualization.
         
-        return highlights
-    
-    def get_emotion_timeline(self, chunk_emotions):
-        """Create data for emotion timeline visualization"""
-        timeline_data = []
-        for chunk in chunk_emotions:
-            timeline_data.append({
-                'timestamp': chunk['timestamp'],
-                'joy': chunk['emotions'].get('joy', 0),
-                'excitement': chunk['emotions'].get('excitement', 0),
-                'surprise': chunk['emotions'].get('surprise', 0),
-                'overall_excitement': chunk['excitement_score']
-            })
+        Returns a dict of equal-length NumPy arrays (one per column in
+        TIMELINE_COLUMNS). With max_points, long timelines are downsampled
+        with 'lttb' (largest-triangle-three-buckets) or 'minmax' on the
+        overall excitement curve, so charts stay small for long videos.
+        """
+        with metrics.span("emotion_timeline"):
+            return self._build_timeline(chunk_emotions, max_points, method)
+    
+    def _build_timeline(self, chunk_emotions, max_points, method):
+        timeline = {
+            'timestamp': np.array([chunk['timestamp'] for chunk in chunk_emotions], dtype=np.float32),
+            'joy': np.array([chunk['emotions'].get('joy', 0) for chunk in chunk_emotions], dtype=np.float32),
+            'excitement': np.array([chunk['emotions'].get('excitement', 0) for chunk in chunk_emotions], dtype=np.float32),
+            'surprise': np.array([chunk['emotions'].get('surprise', 0) for chunk in chunk_emotions], dtype=np.float32),
+            'overall_excitement': np.array([chunk['excitement_score'] for chunk in chunk_emotions], dtype=np.float32),
+        }
         
-        return timeline_data
\ No newline at end of file
+        if max_points and len(chunk_emotions) > max_points:
+            if method == 'lttb':
+                keep = lttb_indices(timeline['timestamp'], timeline['overall_excitement'], max_points)
+            elif method == 'minmax':
+                keep = minmax_indices(timeline['overall_excitement'], max_points)
+            else:
+                raise ValueError(f"Unknown downsampling method: {method}")
+            timeline = {column: values[keep] for column, values in timeline.items()}
+        
+        return timeline
+
+TIMELINE_COLUMNS = ('timestamp', 'joy', 'excitement', 'surprise', 'overall_excitement')
+
+def lttb_indices(x, y, n_out):
+    """
+    Indices picked by largest-triangle-three-buckets downsampling.
+    Keeps the first and last points and, per bucket, the point forming the
+    largest triangle with the previous pick and the next bucket's mean.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:max(n_out, 0)], dtype=np.int64)
+    
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    picked = np.empty(n_out, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    
+    previous = 0
+    for bucket in range(n_out - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        next_lo = hi
+        next_hi = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        
+        # Twice the triangle area for every candidate in this bucket
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (avg_y - y[previous])
+        )
+        previous = lo + int(np.argmax(areas))
+        picked[bucket + 1] = previous
+    
+    return picked
+
+def minmax_indices(y, n_out):
+    """Indices of the min and max point of each of n_out // 2 buckets, in order"""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    buckets = max(1, n_out // 2)
+    if n <= n_out:
+        return np.arange(n)
+    
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    picked = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi <= lo:
+            continue
+        segment = y[lo:hi]
+        picked.extend((lo + int(np.argmin(segment)), lo + int(np.argmax(segment))))
+    return np.unique(picked)
+
+def benchmark_backends(chunks, backends=BACKENDS, reference='pytorch', min_agreement=0.9, batch_size=16):
+    """
+    Time each inference backend on the same chunks and check that its top
+    labels agree with the reference backend within `min_agreement`.
+    """
+    import time
+    
+    results = {}
+    for backend in backends:
+        if get_emotion_classifier(backend) is None:
+            results[backend] = {'available': False}
+            continue
+        
+        detector = EmotionDetector(batch_size=batch_size, backend=backend)
+        detector._classify_chunks(chunks[:batch_size])  # Warm-up
+        
+        started = time.perf_counter()
+        scores = detector._classify_chunks(chunks)
+        elapsed = time.perf_counter() - started
+        
+        results[backend] = {
+            'available': True,
+            'seconds': elapsed,
+            'chunks_per_second': len(chunks) / elapsed if elapsed else 0.0,
+            'labels': [max(score, key=score.get) for score in scores],
+        }
+    
+    baseline = results.get(reference, {})
+    for backend, result in results.items():
+        if not result['available'] or not baseline.get('available'):
+            continue
+        matches = sum(a == b for a, b in zip(result['labels'], baseline['labels']))
+        result['agreement'] = matches / len(chunks) if chunks else 1.0
+        result['speedup'] = baseline['seconds'] / result['seconds'] if result['seconds'] else 0.0
+        result['within_tolerance'] = result['agreement'] >= min_agreement
+    
+    return results
+
+def test_emotion_backends():
+    """Compare the available inference backends on sample chunks"""
+    samples = [
+        "This is absolutely amazing, I can't believe how well this works!",
+        "I'm really worried this will break everything in production.",
+        "Let's go through the configuration options one by one.",
+        "Wow, I did not expect that result at all.",
+        "It's frustrating when the build fails for no obvious reason.",
+        "Thank you all so much, this community makes me so happy.",
+    ]
+    chunks = samples * 20
+    
+    print(f"Benchmarking emotion backends on {len(chunks)} chunks...")
+    for backend, result in benchmark_backends(chunks).items():
+        if not result['available']:
+            print(f"{backend}: not available")
+            continue
+        line = f"{backend}: {result['seconds']:.2f}s ({result['chunks_per_second']:.1f} chunks/s)"
+        if 'agreement' in result:
+            status = "✅" if result['within_tolerance'] else "❌"
+            line += f", {result['speedup']:.2f}x vs pytorch, label agreement {result['agreement']:.0%} {status}"
+        print(line)
+
+if __name__ == "__main__":
+    test_emotion_backends()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+In-process stand-in for the Gemini GenerativeModel.
+
+Select it with GEMINI_BACKEND=fake (no API key needed) to exercise the
+premium path offline: batching, concurrency, the rate limiter, retries and
+the free-mode fallback. Behaviour is tuned with environment variables:
+
+    FAKE_GEMINI_LATENCY=0.5          seconds per request
+    FAKE_GEMINI_JITTER=0.2           extra random latency, 0..jitter seconds
+    FAKE_GEMINI_QUOTA_RATE=0.05      fraction of requests failing with a 429
+    FAKE_GEMINI_MALFORMED_RATE=0.05  fraction of replies that aren't valid JSON
+    FAKE_GEMINI_DROP_RATE=0.05       fraction of batch titles left out of a reply
+    FAKE_GEMINI_RPM=15               server-side requests per minute (0 = unlimited)
+    FAKE_GEMINI_SEED=42              make the failures reproducible
+
+Run this file directly for a small load test of summarize_chunks.
+"""
+
+import os
+import re
+import json
+import time
+import random
+import threading
+from collections import deque
+
+_SEGMENT_RE = re.compile(r'^\{.*"transcript".*\}$', re.MULTILINE)
+_SINGLE_RE = re.compile(r'Transcript:\s*(.*?)\s*Chapter title:', re.DOTALL)
+_WORD_RE = re.compile(r"[A-Za-z]{4,}")
+
+
+class FakeResponse:
+    """Mimics the .text attribute of a Gemini response"""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """
+    Drop-in replacement for genai.GenerativeModel.generate_content.
+
+    Titles are built from the longest words of each segment, so replies are
+    deterministic for a given prompt. Latency, 429s, malformed replies and
+    dropped batch items are injected at the configured rates. Counters are
+    kept for load tests and are safe to read from any thread.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.0, quota_error_rate=0.0, malformed_rate=0.0,
+                 drop_rate=0.0, requests_per_minute=0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.quota_error_rate = quota_error_rate
+        self.malformed_rate = malformed_rate
+        self.drop_rate = drop_rate
+        self.requests_per_minute = requests_per_minute
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = deque()
+        self.calls = 0
+        self.quota_errors = 0
+        self.malformed = 0
+        self.timeouts = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build a fake model configured from FAKE_GEMINI_* environment variables"""
+        seed = os.getenv("FAKE_GEMINI_SEED")
+        return cls(
+            latency=float(os.getenv("FAKE_GEMINI_LATENCY", 0.5)),
+            jitter=float(os.getenv("FAKE_GEMINI_JITTER", 0.0)),
+            quota_error_rate=float(os.getenv("FAKE_GEMINI_QUOTA_RATE", 0.0)),
+            malformed_rate=float(os.getenv("FAKE_GEMINI_MALFORMED_RATE", 0.0)),
+            drop_rate=float(os.getenv("FAKE_GEMINI_DROP_RATE", 0.0)),
+            requests_per_minute=int(os.getenv("FAKE_GEMINI_RPM", 0)),
+            seed=int(seed) if seed else None,
+        )
+
+    def _roll(self, rate):
+        with self._lock:
+            return self._random.random() < rate
+
+    def _rate_limit_wait(self):
+        """
+        Sliding one-minute window, like the real per-minute quota.
+        Returns seconds until a slot frees up, or 0 if the request may proceed.
+        """
+        if not self.requests_per_minute:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if len(self._recent) >= self.requests_per_minute:
+                return 60 - (now - self._recent[0])
+            self._recent.append(now)
+            return 0
+
+    def generate_content(self, prompt, request_options=None, generation_config=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._random.random() * self.jitter
+
+        wait = self._rate_limit_wait()
+        if wait or self._roll(self.quota_error_rate):
+            with self._lock:
+                self.quota_errors += 1
+            # Same shape as the real API, including the suggested retry delay
+            raise Exception(
+                "429 Resource has been exhausted (e.g. check quota). "
+                f"retry_delay {{ seconds: {max(1, round(wait))} }}"
+            )
+
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            with self._lock:
+                self.timeouts += 1
+            raise Exception("504 Deadline Exceeded")
+        time.sleep(delay)
+
+        segments = _SEGMENT_RE.findall(prompt)
+        if self._roll(self.malformed_rate):
+            with self._lock:
+                self.malformed += 1
+            if segments:
+                return FakeResponse('[{"id": 0, "title": "Truncated')
+            return FakeResponse("Sure! Here is a chapter title for you:\n\n**Title**")
+
+        if segments:
+            items = []
+            for line in segments:
+                segment = json.loads(line)
+                if not self._roll(self.drop_rate):
+                    items.append({"id": segment["id"], "title": _fake_title(segment["transcript"])})
+            return FakeResponse(json.dumps(items))
+
+        match = _SINGLE_RE.search(prompt)
+        return FakeResponse(_fake_title(match.group(1) if match else prompt))
+
+    def stats(self):
+        """Request counters"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "quota_errors": self.quota_errors,
+                "malformed": self.malformed,
+                "timeouts": self.timeouts,
+            }
+
+
+def _fake_title(text):
+    """Short deterministic title from the longest words of the text"""
+    words = sorted(set(w.lower() for w in _WORD_RE.findall(text)), key=lambda w: (-len(w), w))[:3]
+    if not words:
+        return "🤖 Untitled Segment"
+    return "🤖 " + " ".join(w.title() for w in words)
+
+
+def load_test(chunk_count=200, batch_size=None, max_workers=None, **model_options):
+    """
+    Time summarize_chunks against a fake model and report what happened.
+    Each run gets its own title-cache namespace so earlier runs can't
+    answer from the cache.
+    """
+    import summarize
+    from benchmark import synthetic_transcript
+    from split_text import split_transcript
+
+    text, transcript = synthetic_transcript(chunk_count * 100 / 150)
+    chunks = [chunk['text'] for chunk in split_transcript(transcript, max_words=100)]
+
+    model = FakeGeminiModel(**model_options)
+    summarize.set_model_backend(model, f"fake-{time.time_ns()}")
+    started = time.perf_counter()
+    titles = summarize.summarize_chunks(
+        chunks,
+        batch_size=batch_size or summarize.BATCH_SIZE,
+        max_workers=max_workers or summarize.MAX_CONCURRENCY,
+    )
+    elapsed = time.perf_counter() - started
+
+    gemini_titles = sum(1 for title in titles if title.startswith("🤖"))
+    return {
+        "chunks": len(chunks),
+        "seconds": elapsed,
+        "gemini_titles": gemini_titles,
+        "free_titles": len(titles) - gemini_titles,
+        **model.stats(),
+    }
+
+
+if __name__ == "__main__":
+    import tempfile
+    # Keep load-test titles out of the real cache, and don't let the client-side
+    # free-tier limiter dominate the timings (set GEMINI_RPM=15 to include it)
+    os.environ.setdefault("VIBECHAPTERS_CACHE_DIR", tempfile.mkdtemp(prefix="fake_gemini_"))
+    os.environ.setdefault("GEMINI_RPM", "600")
+
+    scenarios = [
+        ("clean", {"latency": 0.3}),
+        ("slow + jitter", {"latency": 0.8, "jitter": 0.5}),
+        ("malformed 20%", {"latency": 0.3, "malformed_rate": 0.2, "seed": 1}),
+        ("dropped titles 10%", {"latency": 0.3, "drop_rate": 0.1, "seed": 1}),
+        ("429 on 3rd request", {"latency": 0.3, "requests_per_minute": 2}),
+    ]
+    for name, options in scenarios:
+        result = load_test(**options)
+        print(f"{name}: {result['chunks']} chunks in {result['seconds']:.2f}s, "
+              f"{result['gemini_titles']} model / {result['free_titles']} free titles, "
+              f"{result['calls']} calls, {result['quota_errors']} 429s, {result['malformed']} malformed")
@@ -1,9 +1,20 @@
+import os
 import time
 import random
 import json
 import re
-from youtube_transcript_api import YouTubeTranscriptApi
+import atexit
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from cache import get_transcript_cache
+from transcript import Transcript
+import metrics
 
 # Check if yt-dlp is available
 try:
@@ -13,14 +24,298 @@ except ImportError:
     YT_DLP_AVAILABLE = False
     print("yt-dlp not available, using youtube-transcript-api only")
 
-def get_transcript(video_id, max_retries=3):
+# get_transcript serves English captions when there are any and falls back to
+# other languages otherwise, so it caches one entry per video under this fixed
+# slot rather than per caption language
+CACHE_LANGUAGE = "any"
+
+# Connection pool size for caption downloads
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 16))
+
+YDL_OPTS = {
+    'writesubtitles': True,
+    'writeautomaticsub': True,
+    'subtitleslangs': ['en', 'en-US'],
+    'skip_download': True,
+    'quiet': True,
+    'no_warnings': True,
+    'format': 'best[height<=480]',
+}
+
+_http_session = None
+_http_session_lock = threading.Lock()
+_ydl_pool = []
+_ydl_pool_lock = threading.Lock()
+
+def get_http_session():
+    """
+    Shared requests.Session for caption downloads.
+    Keep-alive connections are pooled so repeated subtitle fetches reuse TLS
+    connections instead of opening a new one per URL.
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=HTTP_POOL_SIZE,
+                max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504]),
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
+
+@contextmanager
+def _youtube_dl():
+    """
+    Borrow a YoutubeDL instance from a process-wide pool.
+    Fetches run on short-lived hedge threads, so instances are pooled rather
+    than kept per thread; one is only created when every pooled one is busy.
+    """
+    with _ydl_pool_lock:
+        ydl = _ydl_pool.pop() if _ydl_pool else None
+    if ydl is None:
+        ydl = yt_dlp.YoutubeDL(YDL_OPTS)
+    try:
+        yield ydl
+    finally:
+        with _ydl_pool_lock:
+            _ydl_pool.append(ydl)
+
+@atexit.register
+def _close_youtube_dl_pool():
+    """Close pooled YoutubeDL instances on exit"""
+    with _ydl_pool_lock:
+        pool = list(_ydl_pool)
+        _ydl_pool.clear()
+    for ydl in pool:
+        try:
+            ydl.close()
+        except Exception:
+            pass
+
+# Seconds to wait on a fetch method before also starting the next one
+HEDGE_DELAY = float(os.getenv("TRANSCRIPT_HEDGE_DELAY", 4))
+
+_VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+def extract_video_id(video_url):
+    """Get the video ID from a YouTube URL (or a bare 11-character ID)"""
+    video_url = video_url.strip()
+    if _VIDEO_ID_RE.match(video_url):
+        return video_url
+    
+    query = urlparse(video_url)
+    if query.hostname == 'youtu.be':
+        return query.path[1:] or None
+    elif query.hostname in ('www.youtube.com', 'youtube.com'):
+        if query.path == '/watch':
+            return parse_qs(query.query).get('v', [None])[0]
+        elif query.path[:7] == '/embed/':
+            return query.path.split('/')[2]
+    return None
+
+def get_transcript(video_id, max_retries=3, use_cache=True):
+    """
+    Get transcript with multiple fallback methods and rate limiting protection.
+    Results (including "no captions" outcomes) are served from the on-disk
+    transcript cache when available.
+    """
+    text, transcript, _ = get_transcript_with_status(video_id, max_retries, use_cache)
+    return text, transcript
+
+def get_transcript_with_status(video_id, max_retries=3, use_cache=True):
+    """
+    Like get_transcript, but also says why no text came back: returns
+    (text, transcript, failure) with failure None, "no_captions",
+    "rate_limited" or "error". Only "no_captions" is worth not retrying.
+    """
+    cache = get_transcript_cache() if use_cache else None
+    if cache:
+        cached = cache.get(video_id, CACHE_LANGUAGE)
+        metrics.inc("transcript_cache_lookups", result="miss" if cached is None else "hit")
+        if cached is not None:
+            text, transcript = cached
+            transcript = Transcript.from_cached(transcript)
+            if text:
+                print(f"⚡ Transcript cache hit for {video_id} ({len(text)} characters)")
+                return text, transcript, None
+            print(f"⚡ Transcript cache hit for {video_id}: no captions available")
+            return text, transcript, "no_captions"
+    
+    with metrics.span("transcript_fetch_total") as span:
+        text, transcript, failure = _fetch_transcript(video_id, max_retries)
+        span.set(video_id=video_id, found=bool(text), failure=failure)
+    
+    if cache:
+        try:
+            if text:
+                cache.put(video_id, text, transcript.to_dict(), CACHE_LANGUAGE)
+            elif failure == "no_captions":
+                # Only remember "no captions" when YouTube said so; network
+                # errors, blocks and timeouts are retried next time
+                cache.put_negative(video_id, CACHE_LANGUAGE)
+        except Exception as e:
+            print(f"⚠️ Could not write transcript cache: {str(e)[:100]}")
+    
+    return text, transcript, failure
+
+class _MethodStats:
+    """Per-method latency/success tracking used to order fetch strategies"""
+    
+    def __init__(self, name, prior_latency):
+        self.name = name
+        self.attempts = 0
+        self.successes = 0
+        self.avg_latency = prior_latency
+        self.last_latency = None
+    
+    def record(self, success, latency):
+        self.attempts += 1
+        self.last_latency = latency
+        if success:
+            self.successes += 1
+            # Exponentially weighted so recent behaviour dominates
+            self.avg_latency = 0.7 * self.avg_latency + 0.3 * latency
+    
+    @property
+    def success_rate(self):
+        # Laplace smoothing keeps untried methods in the running
+        return (self.successes + 1) / (self.attempts + 2)
+    
+    @property
+    def expected_cost(self):
+        """Expected seconds until this method yields a transcript"""
+        return self.avg_latency / self.success_rate
+
+_method_stats = {
+    'youtube_transcript_api': _MethodStats('youtube_transcript_api', 2.0),
+    'yt_dlp': _MethodStats('yt_dlp', 6.0),
+    'alternative': _MethodStats('alternative', 3.0),
+}
+_method_stats_lock = threading.Lock()
+
+def get_transcript_method_stats():
+    """Snapshot of per-method fetch stats, best method first"""
+    with _method_stats_lock:
+        return [
+            {
+                'method': stats.name,
+                'attempts': stats.attempts,
+                'successes': stats.successes,
+                'success_rate': stats.success_rate,
+                'avg_latency': stats.avg_latency,
+                'expected_cost': stats.expected_cost,
+            }
+            for stats in sorted(_method_stats.values(), key=lambda m: m.expected_cost)
+        ]
+
+def _ordered_methods():
+    """Fetch methods sorted by expected time to a successful transcript"""
+    methods = {
+        'youtube_transcript_api': _fetch_with_transcript_api,
+        'alternative': lambda video_id, max_retries, state: get_transcript_alternative(video_id, state),
+    }
+    if YT_DLP_AVAILABLE:
+        methods['yt_dlp'] = lambda video_id, max_retries, state: get_transcript_with_ytdlp(video_id, state)
+    
+    with _method_stats_lock:
+        order = sorted(methods, key=lambda name: _method_stats[name].expected_cost)
+    return [(name, methods[name]) for name in order]
+
+def _run_method(name, method, video_id, max_retries, state):
+    """Run one fetch method, recording its latency and outcome"""
+    started = time.monotonic()
+    success = False
+    try:
+        with metrics.span("transcript_fetch", method=name):
+            text, transcript = method(video_id, max_retries, state)
+        success = bool(text)
+        if not success:
+            raise Exception("empty transcript")
+        return text, transcript
+    finally:
+        # A method interrupted because another one won says nothing about it
+        if success or not state['cancel'].is_set():
+            with _method_stats_lock:
+                _method_stats[name].record(success, time.monotonic() - started)
+            metrics.inc("transcript_fetch_results", method=name, outcome="success" if success else "failure")
+        else:
+            metrics.inc("transcript_fetch_results", method=name, outcome="cancelled")
+
+def _fetch_transcript(video_id, max_retries=3, hedge_delay=HEDGE_DELAY):
     """
-    Get transcript with multiple fallback methods and rate limiting protection
+    Fetch a transcript from YouTube without touching the cache.
+    
+    Methods are started in order of their track record; if the current one
+    hasn't answered within hedge_delay seconds (or fails), the next one is
+    launched alongside it. The first valid transcript wins and the rest are
+    told to stop. Returns (text, transcript_data, failure) where failure is
+    None on success, "no_captions" when YouTube reported the video has no
+    captions in any language, "rate_limited" after a 429, or "error" otherwise.
     """
     print(f"Attempting to get transcript for video: {video_id}")
+    state = {'cancel': threading.Event(), 'rate_limited': False, 'no_captions': False}
+    methods = _ordered_methods()
+    
+    pool = ThreadPoolExecutor(max_workers=len(methods))
+    running = {}
+    pending = list(methods)
+    
+    def launch_next():
+        if pending:
+            name, method = pending.pop(0)
+            print(f"▶️ Starting {name} fetch")
+            running[metrics.submit(pool, _run_method, name, method, video_id, max_retries, state)] = name
+    
+    try:
+        launch_next()
+        while running:
+            done, _ = wait(running, timeout=hedge_delay, return_when=FIRST_COMPLETED)
+            
+            if not done:
+                # Current methods are slow: hedge with the next one
+                launch_next()
+                continue
+            
+            for future in done:
+                name = running.pop(future)
+                try:
+                    text, transcript = future.result()
+                except Exception as e:
+                    print(f"❌ {name} failed: {str(e)[:100]}...")
+                    continue
+                
+                print(f"✅ Got transcript via {name} ({len(text)} characters)")
+                state['cancel'].set()
+                return text, transcript, None
+            
+            if not running:
+                launch_next()
+    finally:
+        state['cancel'].set()
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    # If all methods fail
+    print("❌ All transcript methods failed")
+    if state['rate_limited']:
+        failure = "rate_limited"
+    elif state['no_captions']:
+        failure = "no_captions"
+    else:
+        failure = "error"
+    return "", Transcript.from_segments([]), failure
+
+def _fetch_with_transcript_api(video_id, max_retries, state):
+    """Method 1: youtube-transcript-api with retries and delays"""
+    cancel = state['cancel']
+    last_error = None
     
-    # Method 1: Try youtube-transcript-api with retries and delays
     for attempt in range(max_retries):
+        if cancel.is_set():
+            break
         try:
             print(f"Method 1 - Attempt {attempt + 1}: youtube-transcript-api")
             
@@ -28,7 +323,8 @@ def get_transcript(video_id, max_retries=3):
             if attempt > 0:
                 delay = random.uniform(2, 5) * attempt
                 print(f"Waiting {delay:.1f} seconds before retry...")
-                time.sleep(delay)
+                if cancel.wait(delay):
+                    break
             
             # Try the simple approach first
             transcript_list = YouTubeTranscriptApi.get_transcript(
@@ -36,164 +332,169 @@ def get_transcript(video_id, max_retries=3):
                 languages=['en', 'en-US', 'en-GB']
             )
             
-            text = " ".join([item['text'] for item in transcript_list])
-            print(f"✅ Success with youtube-transcript-api! Got {len(text)} characters")
-            return text, transcript_list
+            transcript = Transcript.from_segments(transcript_list)
+            return transcript.text, transcript
             
+        except TranscriptsDisabled as e:
+            # YouTube answered: retrying won't make captions appear
+            last_error = e
+            state['no_captions'] = True
+            break
+        except NoTranscriptFound as e:
+            # No English captions, but other languages may exist for the alternative method
+            last_error = e
+            break
         except Exception as e:
+            last_error = e
             print(f"❌ youtube-transcript-api attempt {attempt + 1} failed: {str(e)[:100]}...")
             if "429" in str(e) or "Too Many Requests" in str(e):
                 print("Rate limited - waiting longer...")
-                time.sleep(random.uniform(10, 20))
+                state['rate_limited'] = True
+                if cancel.wait(random.uniform(10, 20)):
+                    break
             continue
     
-    # Method 2: Try yt-dlp for subtitle extraction
-    if YT_DLP_AVAILABLE:
-        try:
-            print("Method 2: Trying yt-dlp...")
-            return get_transcript_with_ytdlp(video_id)
-        except Exception as e:
-            print(f"❌ yt-dlp failed: {str(e)[:100]}...")
-    
-    # Method 3: Try alternative YouTube transcript approach
-    try:
-        print("Method 3: Trying alternative transcript API...")
-        return get_transcript_alternative(video_id)
-    except Exception as e:
-        print(f"❌ Alternative method failed: {str(e)[:100]}...")
-    
-    # If all methods fail
-    print("❌ All transcript methods failed")
-    return "", []
+    raise Exception(f"youtube-transcript-api failed: {last_error}")
 
-def get_transcript_with_ytdlp(video_id):
+def get_transcript_with_ytdlp(video_id, state=None):
     """Use yt-dlp to extract subtitles"""
     if not YT_DLP_AVAILABLE:
         raise Exception("yt-dlp not available")
     
-    ydl_opts = {
-        'writesubtitles': True,
-        'writeautomaticsub': True,
-        'subtitleslangs': ['en', 'en-US'],
-        'skip_download': True,
-        'quiet': True,
-        'no_warnings': True,
-        'format': 'best[height<=480]',
-    }
-    
     url = f"https://www.youtube.com/watch?v={video_id}"
+    session = get_http_session()
     
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        try:
+    try:
+        with _youtube_dl() as ydl:
             info = ydl.extract_info(url, download=False)
-            
-            # Try automatic subtitles first
-            if 'automatic_captions' in info and info['automatic_captions']:
-                for lang in ['en', 'en-US', 'en-GB']:
-                    if lang in info['automatic_captions']:
-                        for format_info in info['automatic_captions'][lang]:
-                            if format_info['ext'] in ['json3', 'srv1', 'srv2', 'srv3']:
-                                try:
-                                    response = requests.get(format_info['url'], timeout=10)
-                                    if response.status_code == 200:
-                                        subtitle_text = parse_json_captions(response.text)
-                                        if subtitle_text:
-                                            print(f"✅ Got JSON auto captions via yt-dlp ({lang})")
-                                            return subtitle_text, create_transcript_data(subtitle_text)
-                                except:
-                                    continue
-                            
-                            elif format_info['ext'] == 'vtt':
-                                try:
-                                    response = requests.get(format_info['url'], timeout=10)
-                                    if response.status_code == 200:
-                                        subtitle_text = parse_vtt_captions(response.text)
-                                        if subtitle_text:
-                                            print(f"✅ Got VTT auto captions via yt-dlp ({lang})")
-                                            return subtitle_text, create_transcript_data(subtitle_text)
-                                except:
-                                    continue
         
-        except Exception as e:
-            raise Exception(f"yt-dlp extraction failed: {e}")
+        # Try automatic subtitles first
+        if 'automatic_captions' in info and info['automatic_captions']:
+            for lang in ['en', 'en-US', 'en-GB']:
+                if lang in info['automatic_captions']:
+                    for format_info in info['automatic_captions'][lang]:
+                        if format_info['ext'] == 'json3':
+                            parser, label = parse_json3_segments, "JSON"
+                        elif format_info['ext'] == 'vtt':
+                            parser, label = parse_vtt_segments, "VTT"
+                        else:
+                            continue
+                        
+                        try:
+                            response = session.get(format_info['url'], timeout=10)
+                            if response.status_code == 200:
+                                transcript = parser(response.text)
+                                if transcript:
+                                    print(f"✅ Got {label} auto captions via yt-dlp ({lang})")
+                                    return transcript.text, transcript
+                        except Exception:
+                            continue
+    
+    except Exception as e:
+        raise Exception(f"yt-dlp extraction failed: {e}")
     
+    # Only "no captions in any language" is final: the alternative method
+    # accepts other languages too
+    if state is not None and not info.get('subtitles') and not info.get('automatic_captions'):
+        state['no_captions'] = True
     raise Exception("No subtitles found via yt-dlp")
 
-def parse_json_captions(json_content):
-    """Parse JSON format captions from YouTube"""
+# Precompiled patterns for caption parsing
+_VTT_CUE_RE = re.compile(
+    r'(?:(\d+):)?(\d{2}):(\d{2})[.,](\d{3})[ \t]+-->[ \t]+'
+    r'(?:(\d+):)?(\d{2}):(\d{2})[.,](\d{3})[^\n]*\n'
+    r'(.*?)(?=\n[ \t]*\n|\Z)',
+    re.S
+)
+_VTT_TAG_RE = re.compile(r'<[^>]+>')
+_VTT_NOISE_RE = re.compile(r'\[.*?\]|\(.*?\)')
+_HTML_ENTITY_RE = re.compile(r'&\w+;')
+
+def parse_json3_segments(json_content):
+    """
+    Parse YouTube json3 captions into a timed Transcript.
+    Each caption event becomes one segment using its tStartMs/dDurationMs.
+    """
+    starts, durations, texts = [], [], []
     try:
         data = json.loads(json_content)
-        if 'events' in data:
-            text_parts = []
-            for event in data['events']:
-                if 'segs' in event:
-                    for seg in event['segs']:
-                        if 'utf8' in seg:
-                            text_parts.append(seg['utf8'])
-            return ' '.join(text_parts)
-    except:
-        pass
-    return ""
+    except ValueError:
+        return Transcript.from_segments([])
+    
+    for event in data.get('events', ()):
+        segs = event.get('segs')
+        if not segs:
+            continue
+        text = " ".join("".join(seg.get('utf8', '') for seg in segs).split())
+        if not text:
+            continue
+        starts.append(event.get('tStartMs', 0) / 1000.0)
+        durations.append(event.get('dDurationMs', 0) / 1000.0)
+        texts.append(text)
+    
+    return Transcript.from_columns(starts, durations, texts)
 
-def parse_vtt_captions(vtt_content):
-    """Parse VTT format captions and clean up the text"""
+def parse_vtt_segments(vtt_content):
+    """
+    Parse VTT captions into a timed Transcript in a single pass over the cues.
+    Rolling auto-caption lines that repeat the previous cue are dropped.
+    """
     # Skip if this looks like M3U playlist data
     if vtt_content.startswith('#EXTM3U') or '#EXT-X-' in vtt_content:
-        return ""
-    
-    lines = vtt_content.split('\n')
-    text_lines = []
-    
-    for line in lines:
-        line = line.strip()
-        # Skip VTT headers, timing lines, and empty lines
-        if (not line or 
-            line.startswith('WEBVTT') or 
-            line.startswith('NOTE') or 
-            line.startswith('#') or  # Skip M3U/playlist lines
-            '-->' in line or
-            line.startswith('<') or
-            line.isdigit() or
-            'http' in line.lower()):  # Skip URLs
-            continue
+        return Transcript.from_segments([])
+    
+    # The cue pattern expects \n line endings
+    vtt_content = vtt_content.replace('\r\n', '\n').replace('\r', '\n')
+    
+    starts, durations, texts = [], [], []
+    previous_line = None
+    
+    for cue in _VTT_CUE_RE.finditer(vtt_content):
+        h1, m1, s1, ms1, h2, m2, s2, ms2, body = cue.groups()
+        start = int(h1 or 0) * 3600 + int(m1) * 60 + int(s1) + int(ms1) / 1000.0
+        end = int(h2 or 0) * 3600 + int(m2) * 60 + int(s2) + int(ms2) / 1000.0
         
-        # Skip timing patterns
-        if re.match(r'^\d{2}:\d{2}:\d{2}', line):
-            continue
+        new_lines = []
+        for line in body.splitlines():
+            # Clean up HTML tags and common artifacts
+            line = _VTT_TAG_RE.sub('', line)
+            line = _VTT_NOISE_RE.sub('', line)
+            line = _HTML_ENTITY_RE.sub(' ', line)
+            line = " ".join(line.split())
             
-        # Clean up HTML tags and common artifacts
-        line = re.sub(r'<[^>]+>', '', line)
-        line = re.sub(r'\[.*?\]', '', line)
-        line = re.sub(r'\(.*?\)', '', line)
-        line = re.sub(r'&\w+;', ' ', line)  # Remove HTML entities
+            # Only keep lines with actual words (not just punctuation/numbers or URLs)
+            if not line or 'http' in line.lower() or not any(c.isalpha() for c in line):
+                continue
+            if line == previous_line:
+                continue
+            new_lines.append(line)
+            previous_line = line
         
-        # Only keep lines with actual words (not just punctuation/numbers)
-        if line and len(line) > 3 and any(c.isalpha() for c in line):
-            text_lines.append(line)
-    
-    result = ' '.join(text_lines)
-    # Final cleanup
-    result = ' '.join(result.split())  # Normalize whitespace
-    return result
+        if new_lines:
+            starts.append(start)
+            durations.append(max(0.0, end - start))
+            texts.append(" ".join(new_lines))
+    
+    return Transcript.from_columns(starts, durations, texts)
+
+def parse_json_captions(json_content):
+    """Parse JSON format captions from YouTube"""
+    return parse_json3_segments(json_content).text
+
+def parse_vtt_captions(vtt_content):
+    """Parse VTT format captions and clean up the text"""
+    return parse_vtt_segments(vtt_content).text
 
 def create_transcript_data(text):
     """Create fake transcript data with timestamps for compatibility"""
-    words = text.split()
-    transcript_data = []
-    
-    for i, word in enumerate(words):
-        transcript_data.append({
-            'text': word,
-            'start': i * 0.6,  # 0.6 seconds per word
-            'duration': 0.6
-        })
-    
-    return transcript_data
+    return Transcript.from_words(text, 0.6)  # 0.6 seconds per word
 
-def get_transcript_alternative(video_id):
+def get_transcript_alternative(video_id, state=None):
     """Alternative method using different transcript approach"""
     try:
         transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+        if state is not None and not list(transcript_list):
+            state['no_captions'] = True
         
         # Try different language combinations
         language_priorities = [
@@ -216,7 +517,8 @@ def get_transcript_alternative(video_id):
                     else:
                         continue
                 
-                text = " ".join([item['text'] for item in transcript])
+                transcript = Transcript.from_segments(transcript)
+                text = transcript.text
                 if text.strip():
                     lang_str = languages[0] if languages else "auto-detected"
                     print(f"✅ Got transcript via alternative method ({lang_str})")
@@ -225,6 +527,10 @@ def get_transcript_alternative(video_id):
             except Exception as e:
                 continue
         
+    except TranscriptsDisabled as e:
+        if state is not None:
+            state['no_captions'] = True
+        raise Exception(f"Alternative transcript method failed: {e}")
     except Exception as e:
         raise Exception(f"Alternative transcript method failed: {e}")
     
@@ -265,15 +571,7 @@ def get_demo_transcript(video_id):
     """
     
     # Create fake transcript data with timestamps
-    words = demo_text.split()
-    transcript_data = []
-    
-    for i, word in enumerate(words):
-        transcript_data.append({
-            'text': word,
-            'start': i * 0.5,  # 0.5 seconds per word
-            'duration': 0.5
-        })
+    transcript_data = Transcript.from_words(demo_text, 0.5)  # 0.5 seconds per word
     
     return demo_text.strip(), transcript_data
 
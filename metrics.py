@@ -0,0 +1,282 @@
+import json
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# Prefix for every exported Prometheus metric
+METRIC_PREFIX = "vibechapters"
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Recent samples kept per histogram for p50/p95
+RESERVOIR_SIZE = 2048
+
+
+class Histogram:
+    """
+    Cumulative Prometheus-style buckets plus a window of recent samples,
+    so both the exported distribution and live percentiles are cheap.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, reservoir_size=RESERVOIR_SIZE):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=reservoir_size)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+
+    def quantiles(self, qs=(50, 95)):
+        """Percentiles over the recent samples (None when empty)"""
+        if not self.recent:
+            return [None] * len(qs)
+        return [float(v) for v in np.percentile(np.fromiter(self.recent, dtype=np.float64), qs)]
+
+
+class Span:
+    """One timed operation; extra attributes end up in the JSON trace"""
+
+    __slots__ = ('name', 'labels', 'attributes', 'started', 'duration', 'error', 'thread')
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.attributes = {}
+        self.started = time.time()
+        self.duration = None
+        self.error = None
+        self.thread = threading.current_thread().name
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self, origin):
+        return {
+            'name': self.name,
+            'labels': dict(self.labels),
+            'attributes': self.attributes,
+            'start': round(self.started - origin, 6),
+            'duration': round(self.duration, 6) if self.duration is not None else None,
+            'error': self.error,
+            'thread': self.thread,
+        }
+
+
+class Trace:
+    """
+    Spans finished while the trace was active, in the context that opened it
+    or on worker threads started with submit()
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.duration = None
+        self.spans = []
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            # Abandoned workers can finish after the run is over
+            if not self.closed:
+                self.spans.append(span)
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.started)
+        return {
+            'name': self.name,
+            'started_at': self.started,
+            'duration': self.duration,
+            'spans': [span.to_dict(self.started) for span in spans],
+        }
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters, histograms and spans.
+
+    Metrics are identified by name plus keyword labels, e.g.
+    span("transcript_fetch", method="yt_dlp"). Spans time a block into the
+    histogram of the same name, count failures in "<name>_errors", and are
+    recorded in the traces active in the current context, so concurrent
+    runs (e.g. Streamlit sessions) only see their own spans.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._traces = contextvars.ContextVar(f"traces_{id(self)}", default=())
+
+    def inc(self, name, value=1, **labels):
+        """Add to a counter"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record a sample (seconds for spans) in a histogram"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Time the enclosed block"""
+        span = Span(name, _label_key(labels))
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {str(e)[:200]}"
+            self.inc(f"{name}_errors", **labels)
+            raise
+        finally:
+            span.duration = time.perf_counter() - started
+            self.observe(name, span.duration, **labels)
+            for trace in self._traces.get():
+                trace.add(span)
+
+    @contextmanager
+    def trace(self, name):
+        """Collect every span finished while the block runs into a Trace"""
+        trace = Trace(name)
+        token = self._traces.set(self._traces.get() + (trace,))
+        started = time.perf_counter()
+        try:
+            yield trace
+        finally:
+            trace.duration = time.perf_counter() - started
+            trace.close()
+            self._traces.reset(token)
+
+    def summary(self):
+        """Per-histogram count, mean, p50 and p95, sorted by name"""
+        with self._lock:
+            rows = []
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                p50, p95 = histogram.quantiles((50, 95))
+                rows.append({
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': histogram.count,
+                    'mean': histogram.sum / histogram.count if histogram.count else None,
+                    'p50': p50,
+                    'p95': p95,
+                })
+            return rows
+
+    def counters(self):
+        """Current counter values as a list of dicts"""
+        with self._lock:
+            return [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+
+    def prometheus_text(self):
+        """Everything in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+
+            last = None
+            for (name, labels), value in counters:
+                metric = f"{METRIC_PREFIX}_{name}_total"
+                if metric != last:
+                    lines.append(f"# TYPE {metric} counter")
+                    last = metric
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+            last = None
+            for (name, labels), histogram in histograms:
+                metric = f"{METRIC_PREFIX}_{name}_seconds"
+                if metric != last:
+                    lines.append(f"# TYPE {metric} histogram")
+                    last = metric
+                for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                    lines.append(f"{metric}_bucket{_format_labels(labels, [('le', repr(float(bound)))])} {count}")
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Drop every counter and histogram"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+# Process-wide registry used by the pipeline modules
+_registry = MetricsRegistry()
+
+
+def get_metrics():
+    """Return the process-wide metrics registry"""
+    return _registry
+
+
+def span(name, **labels):
+    """Time a block in the process-wide registry"""
+    return _registry.span(name, **labels)
+
+
+def inc(name, value=1, **labels):
+    """Add to a counter in the process-wide registry"""
+    _registry.inc(name, value, **labels)
+
+
+def trace(name):
+    """Collect a per-run JSON trace from the process-wide registry"""
+    return _registry.trace(name)
+
+
+def submit(pool, fn, *args, **kwargs):
+    """
+    pool.submit() in a copy of the caller's context, so spans finished on
+    the worker thread are recorded in the caller's active traces
+    """
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
@@ -0,0 +1,209 @@
+import os
+import time
+import sqlite3
+import threading
+
+from cache import DEFAULT_CACHE_DIR
+
+# Shared ledger file; every process using the same API key must point here.
+# Set GEMINI_QUOTA_LEDGER=off to fall back to per-process limits.
+LEDGER_PATH = os.getenv("GEMINI_QUOTA_LEDGER", os.path.join(DEFAULT_CACHE_DIR, "gemini_quota.sqlite3"))
+
+# Fraction of the key's capacity guaranteed to interactive (app) callers;
+# batch jobs are guaranteed the rest
+INTERACTIVE_SHARE = float(os.getenv("GEMINI_INTERACTIVE_SHARE", 0.5))
+
+# A caller class only holds back its unused share while it has been active this recently
+ACTIVE_WINDOW_SECONDS = float(os.getenv("GEMINI_QUOTA_ACTIVE_WINDOW", 300))
+
+# Per-minute requests batch jobs never borrow, even while the app is idle,
+# so the first request from someone opening the app doesn't queue behind them
+INTERACTIVE_MINUTE_RESERVE = int(os.getenv("GEMINI_INTERACTIVE_RESERVE", 2))
+
+CALLERS = ("interactive", "batch")
+WINDOWS = (("minute", 60), ("day", 24 * 3600))
+
+
+class QuotaLedger:
+    """
+    Cross-process record of Gemini requests in a local SQLite file.
+
+    Every request is checked against the per-minute and per-day limits and
+    recorded inside one BEGIN IMMEDIATE transaction, so concurrent Streamlit
+    workers and batch jobs sharing a key can't oversubscribe it together.
+
+    Capacity is shared fairly: each caller class ("interactive", "batch")
+    is guaranteed its share of both windows. Per-minute capacity the other
+    class hasn't used can be borrowed unless that class has been active
+    recently, except for a small interactive reserve batch jobs never
+    take. Borrowed daily requests don't come back for a day, so batch
+    jobs never borrow the interactive daily share (the app always has its
+    share left when someone opens it), while the app may borrow the batch
+    daily share on days no batch job has run.
+    """
+
+    def __init__(self, requests_per_minute, requests_per_day, path=LEDGER_PATH,
+                 interactive_share=INTERACTIVE_SHARE, active_window=ACTIVE_WINDOW_SECONDS,
+                 interactive_reserve=INTERACTIVE_MINUTE_RESERVE):
+        self.limits = {"minute": requests_per_minute, "day": requests_per_day}
+        self.shares = {"interactive": interactive_share, "batch": 1 - interactive_share}
+        self.active_window = active_window
+        self.interactive_reserve = interactive_reserve
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode so we control the (cross-process) write transaction
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS requests (
+                id INTEGER PRIMARY KEY,
+                caller TEXT NOT NULL,
+                ts REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_requests_ts ON requests (ts)")
+
+    def _usage(self, now):
+        """Requests per caller in each window, plus each caller's last request time"""
+        usage = {window: {caller: 0 for caller in CALLERS} for window, _ in WINDOWS}
+        last_seen = {caller: None for caller in CALLERS}
+        for window, seconds in WINDOWS:
+            rows = self._conn.execute(
+                "SELECT caller, COUNT(*), MAX(ts) FROM requests WHERE ts > ? GROUP BY caller",
+                (now - seconds,)
+            ).fetchall()
+            for caller, count, last in rows:
+                if caller in usage[window]:
+                    usage[window][caller] = count
+                    last_seen[caller] = last
+        return usage, last_seen
+
+    def _denied_window(self, caller, usage, last_seen, now):
+        """The first window that has no room for `caller`, or None"""
+        for window, _ in WINDOWS:
+            limit = self.limits[window]
+            if limit is None:
+                continue
+            used = usage[window]
+            total = sum(used.values())
+            if total >= limit:
+                return window
+
+            # Keep back the unused share of every other caller class that's active.
+            # Borrowed minute slots come back within a minute, daily ones don't:
+            # the interactive daily share is always kept, the batch one once a
+            # batch job has used the key today. An idle app still keeps its
+            # minute reserve.
+            held_back = 0
+            for other in CALLERS:
+                if other == caller:
+                    continue
+                share = int(self.shares[other] * limit)
+                if window == "day":
+                    active = other == "interactive" or used[other] > 0
+                else:
+                    active = last_seen[other] is not None and now - last_seen[other] <= self.active_window
+                if not active and other == "interactive":
+                    share = min(share, self.interactive_reserve)
+                elif not active:
+                    continue
+                held_back += max(0, share - used[other])
+
+            guaranteed = used[caller] < int(self.shares[caller] * limit)
+            if not guaranteed and total + held_back >= limit:
+                return window
+        return None
+
+    def _wait_for(self, window, now):
+        """Seconds until the oldest request in `window` ages out"""
+        seconds = dict(WINDOWS)[window]
+        oldest = self._conn.execute(
+            "SELECT MIN(ts) FROM requests WHERE ts > ?", (now - seconds,)
+        ).fetchone()[0]
+        if oldest is None:
+            return 0.0
+        return max(0.0, oldest + seconds - now)
+
+    def try_acquire(self, caller="interactive"):
+        """
+        Record one request for `caller` if the limits allow it.
+        Returns (granted, window, wait): window is "minute" or "day" when
+        denied and wait estimates the seconds until a slot frees up.
+        """
+        if caller not in CALLERS:
+            raise ValueError(f"Unknown quota caller: {caller}")
+
+        with self._lock:
+            now = time.time()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM requests WHERE ts <= ?", (now - 24 * 3600,))
+                usage, last_seen = self._usage(now)
+                window = self._denied_window(caller, usage, last_seen, now)
+                if window is None:
+                    self._conn.execute("INSERT INTO requests (caller, ts) VALUES (?, ?)", (caller, now))
+                    wait = 0.0
+                else:
+                    wait = self._wait_for(window, now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return window is None, window, wait
+
+    def acquire(self, caller="interactive", timeout=None):
+        """
+        Wait for a request slot. Returns (True, None, 0.0) once recorded, or
+        (False, window, seconds) if the daily budget is used up or `timeout`
+        expires first, with seconds until a slot should free up.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            granted, window, wait = self.try_acquire(caller)
+            if granted:
+                return True, None, 0.0
+            if window == "day":
+                return False, window, wait
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False, window, wait
+                wait = min(wait, remaining)
+            time.sleep(min(max(wait, 0.05), 60))
+
+    def usage(self):
+        """Requests per caller in the current minute and day windows"""
+        with self._lock:
+            usage, _ = self._usage(time.time())
+        return {
+            window: dict(counts, limit=self.limits[window])
+            for window, counts in usage.items()
+        }
+
+    def clear(self):
+        """Forget every recorded request"""
+        with self._lock:
+            self._conn.execute("DELETE FROM requests")
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_quota_ledger(requests_per_minute, requests_per_day):
+    """Return the process-wide quota ledger, or None if disabled or it can't be opened"""
+    global _ledger
+    if LEDGER_PATH.lower() in ("off", "none", "0", ""):
+        return None
+    with _ledger_lock:
+        if _ledger is None:
+            try:
+                _ledger = QuotaLedger(requests_per_minute, requests_per_day)
+            except Exception as e:
+                print(f"⚠️ Gemini quota ledger unavailable: {e}")
+                return None
+        return _ledger
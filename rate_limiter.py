@@ -0,0 +1,269 @@
+import time
+import threading
+from collections import deque
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Tokens refill continuously at `rate_per_minute`; up to `capacity` tokens
+    can be banked for short bursts.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available; return seconds to wait otherwise (0 on success)"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1, timeout=None):
+        """Block until tokens are available. Returns False if `timeout` expires first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class SlidingWindow:
+    """
+    Thread-safe sliding-window limit: at most `limit` acquisitions in any
+    `seconds`-long window. Unlike a full token bucket it never allows a
+    burst on top of the steady rate, so it matches server-side quotas.
+    """
+
+    def __init__(self, limit, seconds=60.0):
+        self.limit = limit
+        self.seconds = seconds
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Record one request if the window has room; return seconds to wait otherwise (0 on success)"""
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= self.seconds:
+                self._recent.popleft()
+            if len(self._recent) >= self.limit:
+                return self.seconds - (now - self._recent[0])
+            self._recent.append(now)
+            return 0.0
+
+    def acquire(self, timeout=None):
+        """Block until the window has room. Returns False if `timeout` expires first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """
+    Sliding per-minute window combined with a rolling requests-per-day cap,
+    matching how the Gemini free tier is metered.
+    """
+
+    def __init__(self, requests_per_minute, requests_per_day=None):
+        self.minute_window = SlidingWindow(requests_per_minute, 60.0)
+        self.requests_per_day = requests_per_day
+        self._day_started = time.time()
+        self._day_count = 0
+        self._lock = threading.Lock()
+
+    def _reserve_daily(self):
+        with self._lock:
+            if time.time() - self._day_started >= 24 * 3600:
+                self._day_started = time.time()
+                self._day_count = 0
+            if self.requests_per_day is not None and self._day_count >= self.requests_per_day:
+                return False
+            self._day_count += 1
+            return True
+
+    def acquire(self, timeout=None):
+        """
+        Wait for a request slot. Returns False if the daily cap is used up or
+        `timeout` expires before a per-minute token frees up.
+        """
+        if not self._reserve_daily():
+            return False
+        if not self.minute_window.acquire(timeout=timeout):
+            with self._lock:
+                self._day_count -= 1
+            return False
+        return True
+
+    def remaining_today(self):
+        """Requests left in the current daily window (None if uncapped)"""
+        if self.requests_per_day is None:
+            return None
+        with self._lock:
+            return max(0, self.requests_per_day - self._day_count)
+
+    def day_resets_in(self):
+        """Seconds until the rolling daily window starts over"""
+        with self._lock:
+            return max(0.0, 24 * 3600 - (time.time() - self._day_started))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an API whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker for a rate-limited API.
+
+    Per-minute rate limits and daily quota exhaustion are tracked separately:
+    each opens the circuit for the server's Retry-After when it gives one,
+    otherwise for an exponential backoff starting at that kind's cooldown.
+    When the cooldown ends the circuit goes half-open and lets a single probe
+    request through; success closes it, another limit error re-opens it for
+    longer.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, rate_cooldown=20, daily_cooldown=3600, max_rate_cooldown=300,
+                 max_daily_cooldown=24 * 3600, probe_timeout=120):
+        self.cooldowns = {
+            "rate": (rate_cooldown, max_rate_cooldown),
+            "daily": (daily_cooldown, max_daily_cooldown),
+        }
+        self.probe_timeout = probe_timeout
+        self.state = self.CLOSED
+        self.reason = None
+        self._failures = {"rate": 0, "daily": 0}
+        self._open_until = 0.0
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def _advance(self, now):
+        if self.state == self.OPEN and now >= self._open_until:
+            self.state = self.HALF_OPEN
+            self._probe_started = None
+
+    def allow(self):
+        """
+        Whether a request may be sent now. In the half-open state only the
+        first caller gets True (it becomes the probe) until the probe reports
+        back or times out.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN:
+                if self._probe_started is None or now - self._probe_started > self.probe_timeout:
+                    self._probe_started = now
+                    return True
+            return False
+
+    def available(self):
+        """False only while the circuit is open and still cooling down"""
+        with self._lock:
+            self._advance(time.monotonic())
+            return self.state != self.OPEN
+
+    def record_success(self):
+        """A request went through: close the circuit and reset the backoff"""
+        with self._lock:
+            if self.state == self.OPEN:
+                # Sent before the circuit opened, so it says nothing about the limit now
+                return
+            self._close()
+
+    def _close(self):
+        self.state = self.CLOSED
+        self.reason = None
+        self._failures = {"rate": 0, "daily": 0}
+        self._probe_started = None
+
+    def record_failure(self, kind, retry_after=None):
+        """
+        A request hit a limit. `kind` is "rate" or "daily"; `retry_after`
+        is the server's suggested wait in seconds, if any. Returns the
+        number of seconds the circuit stays open.
+        """
+        base, cap = self.cooldowns[kind]
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            # Requests that were already in flight when the circuit opened for
+            # this limit are one burst, not repeated failures: don't back off again
+            if self.state != self.OPEN or self.reason != kind:
+                self._failures[kind] += 1
+            if retry_after is not None:
+                cooldown = max(0.0, float(retry_after))
+            else:
+                cooldown = min(cap, base * 2 ** (self._failures[kind] - 1))
+
+            if self.state == self.OPEN and self._open_until > now + cooldown:
+                # Already open for longer (e.g. the daily quota), keep that
+                return self._open_until - now
+            self.state = self.OPEN
+            self.reason = kind
+            self._open_until = now + cooldown
+            self._probe_started = None
+            return cooldown
+
+    def release(self):
+        """Give back the probe slot after a failure unrelated to limits"""
+        with self._lock:
+            self._probe_started = None
+
+    def reset(self):
+        """Forget all failures"""
+        with self._lock:
+            self._close()
+
+    def retry_in(self):
+        """Seconds until the next probe is allowed (0 when not open)"""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self._open_until - time.monotonic())
+
+    def status(self):
+        """Snapshot for status displays"""
+        with self._lock:
+            self._advance(time.monotonic())
+            return {
+                "state": self.state,
+                "reason": self.reason,
+                "retry_in": max(0.0, self._open_until - time.monotonic()) if self.state == self.OPEN else 0.0,
+                "rate_failures": self._failures["rate"],
+                "daily_failures": self._failures["daily"],
+            }
@@ -1,3 +1,6 @@
+from bisect import bisect_left
+
+
 def split_text(text, max_words=100):
     """
     Split big text into list of chunks, each about max_words words.
@@ -8,3 +11,73 @@ def split_text(text, max_words=100):
         chunk = " ".join(words[i:i+max_words])
         chunks.append(chunk)
     return chunks
+
+
+def build_word_offsets(transcript):
+    """
+    Cumulative word counts over transcript segments.
+    offsets[i] is the number of words before segment i; offsets[-1] is the total.
+    """
+    if hasattr(transcript, 'word_offsets'):
+        return transcript.word_offsets()
+
+    offsets = [0]
+    total = 0
+    for segment in transcript:
+        total += len(segment['text'].split())
+        offsets.append(total)
+    return offsets
+
+
+def segment_for_word(offsets, word_index):
+    """Index of the segment containing the given word (binary search)"""
+    return max(0, bisect_left(offsets, word_index + 1) - 1)
+
+
+def split_transcript(transcript, max_words=100, offsets=None):
+    """
+    Split transcript segments into chunks of about max_words words.
+
+    Boundaries are snapped to the nearest segment edge, so every chunk carries
+    the real start/end time of the captions it covers. Accepts a Transcript or
+    a list of segment dicts. Chunks are yielded as dicts with 'text', 'start',
+    'end', 'word_start' and 'word_end'.
+    """
+    if offsets is None:
+        offsets = build_word_offsets(transcript)
+
+    total_words = offsets[-1]
+    first = 0
+    while first < len(transcript) and offsets[first] < total_words:
+        target = offsets[first] + max_words
+        # First segment edge at or after the target word count
+        last = bisect_left(offsets, target, first + 1)
+        if last > len(transcript):
+            last = len(transcript)
+        elif (last > first + 1 and offsets[last - 1] > offsets[first]
+              and target - offsets[last - 1] < offsets[last] - target):
+            # The previous edge is closer to the target (and still leaves words in the chunk)
+            last -= 1
+
+        if hasattr(transcript, 'text_range'):
+            # Columnar transcript: slice the text buffer and time arrays directly
+            text = transcript.text_range(first, last)
+            start = float(transcript.starts[first])
+            end = float(transcript.starts[last - 1] + transcript.durations[last - 1])
+        else:
+            segments = transcript[first:last]
+            words = []
+            for segment in segments:
+                words.extend(segment['text'].split())
+            text = " ".join(words)
+            start = segments[0]['start']
+            end = segments[-1]['start'] + segments[-1].get('duration', 0)
+
+        yield {
+            'text': text,
+            'start': start,
+            'end': end,
+            'word_start': int(offsets[first]),
+            'word_end': int(offsets[last]),
+        }
+        first = last
@@ -1,29 +1,83 @@
 from dotenv import load_dotenv
 import os
 import re
+import json
+from collections import Counter
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from textblob import TextBlob
+from rate_limiter import RateLimiter, CircuitBreaker, CircuitOpenError
+from cache import get_title_cache, title_cache_key
+from quota_ledger import get_quota_ledger, CALLERS
+import metrics
 
 load_dotenv()  # Load environment variables from .env
 
 # Global state for Gemini availability
 _gemini_available = False
 _gemini_client = None
-_quota_exceeded = False
+
+# Which model backend serves premium titles: "google" (the real Gemini API)
+# or "fake" (fake_gemini.FakeGeminiModel, for offline load testing)
+MODEL_BACKEND = os.getenv("GEMINI_BACKEND", "google").strip().lower()
+_model_backend = None
+
+# Bump these whenever the Gemini prompt or the free title rules change,
+# so cached titles from the old version are not reused
+PROMPT_VERSION = "gemini-v1"
+FREE_VERSION = "free-v1"
+
+# How many chunks to pack into a single Gemini prompt
+BATCH_SIZE = int(os.getenv("GEMINI_BATCH_SIZE", 30))
+
+# Gemini free tier limits and request scheduling
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", 15))
+GEMINI_RPD = int(os.getenv("GEMINI_RPD", 1500))
+MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 4))
+REQUEST_TIMEOUT = float(os.getenv("GEMINI_REQUEST_TIMEOUT", 30))
+
+# Shared by every caller in this process so concurrent work respects the limits;
+# only used when the cross-process quota ledger is disabled or unavailable
+_rate_limiter = RateLimiter(GEMINI_RPM, GEMINI_RPD)
+
+# Who this process counts as in the shared quota ledger ("interactive" or "batch")
+_quota_caller = os.getenv("GEMINI_QUOTA_CALLER", "interactive")
+
+# How long app requests wait for a per-minute slot before falling back to
+# free titles; batch jobs wait as long as it takes
+INTERACTIVE_QUOTA_WAIT = float(os.getenv("GEMINI_INTERACTIVE_WAIT", 10))
+
+# How long to stop calling Gemini after hitting its per-minute or daily limit
+# when the error carries no retry delay (doubles on each repeated failure)
+RATE_LIMIT_COOLDOWN = float(os.getenv("GEMINI_RATE_LIMIT_COOLDOWN", 20))
+DAILY_QUOTA_COOLDOWN = float(os.getenv("GEMINI_DAILY_QUOTA_COOLDOWN", 3600))
+
+# Shared by every session/thread: open while Gemini is rate limited, then
+# half-open with a single probe request before premium titles resume
+_breaker = CircuitBreaker(RATE_LIMIT_COOLDOWN, DAILY_QUOTA_COOLDOWN)
+
+_QUOTA_ERROR_RE = re.compile(r"\b429\b|quota|resource (?:has been )?exhausted|rate.?limit|too many requests|limit reached", re.IGNORECASE)
+_DAILY_QUOTA_RE = re.compile(r"per.?day|daily", re.IGNORECASE)
+_RETRY_AFTER_RES = (
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+(?:\.\d+)?)", re.IGNORECASE),
+    re.compile(r"retry.after:?\s*(\d+(?:\.\d+)?)", re.IGNORECASE),
+    re.compile(r"retry in\s*(\d+(?:\.\d+)?)\s*s", re.IGNORECASE),
+)
 
 def _initialize_gemini():
     """Initialize Gemini client if possible"""
-    global _gemini_available, _gemini_client, _quota_exceeded
+    if MODEL_BACKEND == "fake":
+        from fake_gemini import FakeGeminiModel
+        set_model_backend(FakeGeminiModel.from_env(), "fake")
+        print("🧪 Using fake Gemini backend (offline testing)")
+        return True
     
-    if _quota_exceeded:
-        return False
-        
     try:
         import google.generativeai as genai
         api_key = os.getenv("GEMINI_API_KEY")
         if api_key and api_key.strip() and not api_key.startswith("your_"):
             genai.configure(api_key=api_key)
-            _gemini_client = genai.GenerativeModel('gemini-1.5-flash')
-            _gemini_available = True
+            set_model_backend(genai.GenerativeModel('gemini-1.5-flash'), "google")
             print("✅ Google Gemini configured and ready")
             return True
         else:
@@ -36,6 +90,24 @@ def _initialize_gemini():
         print(f"⚠️ Gemini setup failed: {e}")
         return False
 
+def set_model_backend(client, name="custom"):
+    """
+    Route premium titles through `client`, any object with a Gemini-style
+    generate_content(prompt, request_options=..., **kwargs) returning .text.
+    Pass None to switch to free mode. Titles cached by non-Google backends
+    are kept apart from real Gemini titles.
+    """
+    global _gemini_available, _gemini_client, _model_backend
+    
+    _gemini_client = client
+    _gemini_available = client is not None
+    _model_backend = name if client is not None else None
+    _breaker.reset()
+
+def _gemini_ready():
+    """Gemini is configured and its circuit breaker isn't cooling down"""
+    return _gemini_available and _gemini_client is not None and _breaker.available()
+
 # Initialize on import
 _initialize_gemini()
 
@@ -43,23 +115,60 @@ def summarize_chunk(chunk):
     """
     Generate a short chapter title using Gemini or free fallback
     """
-    global _gemini_available, _quota_exceeded
-    
-    # Try Gemini if available and not quota exceeded
-    if _gemini_available and not _quota_exceeded and _gemini_client:
-        try:
-            return _summarize_chunk_gemini(chunk)
-        except Exception as e:
-            error_str = str(e).lower()
-            if "quota" in error_str or "429" in error_str or "limit" in error_str:
-                print("⚠️ Gemini quota exceeded, switching to free mode")
-                _quota_exceeded = True
-            else:
-                print(f"⚠️ Gemini error: {str(e)[:100]}...")
-            
-            return _summarize_chunk_free(chunk)
-    else:
-        return _summarize_chunk_free(chunk)
+    with metrics.span("summarize", mode="single"):
+        # Try Gemini if available and not rate limited
+        if _gemini_ready():
+            cached = _cached_title(chunk, "gemini")
+            if cached:
+                return cached
+            try:
+                title = _summarize_chunk_gemini(chunk)
+                _store_title(chunk, "gemini", title)
+                return title
+            except Exception as e:
+                _handle_gemini_error(e)
+                return _free_title(chunk)
+        else:
+            return _free_title(chunk)
+
+def _title_version(mode):
+    """Cache version for a title mode (non-Google backends get their own namespace)"""
+    if mode != "gemini":
+        return FREE_VERSION
+    if _model_backend in (None, "google"):
+        return PROMPT_VERSION
+    return f"{PROMPT_VERSION}-{_model_backend}"
+
+def _cached_title(chunk, mode):
+    """Look up a previously generated title for this chunk and mode"""
+    cache = get_title_cache()
+    if not cache:
+        return None
+    return cache.get(title_cache_key(chunk, mode, _title_version(mode)))
+
+def _store_title(chunk, mode, title):
+    """Remember a generated title for this chunk and mode"""
+    cache = get_title_cache()
+    if not cache:
+        return
+    try:
+        cache.put(title_cache_key(chunk, mode, _title_version(mode)), title)
+    except Exception as e:
+        print(f"⚠️ Could not write title cache: {str(e)[:100]}")
+
+def _free_title(chunk):
+    """Free-mode title, served from the title cache when possible"""
+    cached = _cached_title(chunk, "free")
+    if cached:
+        return cached
+    title = _summarize_chunk_free(chunk)
+    _store_title(chunk, "free", title)
+    return title
+
+def get_title_cache_stats():
+    """Hit/miss counters for the chapter title cache"""
+    cache = get_title_cache()
+    return cache.stats() if cache else {}
 
 def _summarize_chunk_gemini(chunk):
     """Use Google Gemini to generate a short chapter title"""
@@ -80,114 +189,545 @@ def _summarize_chunk_gemini(chunk):
     
     Chapter title:"""
     
+    response = _generate(prompt)
+    return _clean_title(response.text)
+
+def _generate(prompt, timeout=REQUEST_TIMEOUT, **kwargs):
+    """Send one rate-limited request to Gemini"""
+    if not _gemini_client:
+        raise Exception("Gemini client not available")
+    
+    if not _breaker.allow():
+        metrics.inc("gemini_requests", outcome="circuit_open")
+        raise CircuitOpenError(f"Gemini paused after hitting its {_breaker.reason} limit")
+    
+    with metrics.span("gemini_rate_limit_wait"):
+        acquired, kind, retry_after = _acquire_quota()
+    if not acquired:
+        metrics.inc("gemini_requests", outcome="daily_limit" if kind == "daily" else "rate_limit_wait")
+        _open_circuit(kind, retry_after)
+        if kind == "daily":
+            raise Exception("Gemini daily request limit reached")
+        raise Exception(f"Gemini per-minute rate limit: no request slot within {INTERACTIVE_QUOTA_WAIT:g}s")
+    
     try:
-        response = _gemini_client.generate_content(prompt)
-        title = response.text.strip()
+        with metrics.span("gemini_request", backend=_model_backend):
+            response = _gemini_client.generate_content(
+                prompt,
+                request_options={"timeout": timeout},
+                **kwargs
+            )
+    except Exception as e:
+        kind = _quota_kind(e)
+        metrics.inc("gemini_requests", outcome=kind or "error")
+        if kind:
+            _open_circuit(kind, _retry_after(e))
+        else:
+            _breaker.release()
+        raise Exception(f"Gemini generation failed: {e}")
+    
+    metrics.inc("gemini_requests", outcome="ok")
+    _breaker.record_success()
+    return response
+
+def _acquire_quota():
+    """
+    Reserve one Gemini request, waiting out per-minute limits (for at most
+    INTERACTIVE_QUOTA_WAIT in the app). Uses the ledger shared by every
+    process on this machine, or the in-process limiter if the ledger is off.
+    Returns (acquired, kind, retry_after) with kind "daily" or "rate" when
+    no slot was reserved.
+    """
+    timeout = INTERACTIVE_QUOTA_WAIT if _quota_caller == "interactive" else None
+    ledger = get_quota_ledger(GEMINI_RPM, GEMINI_RPD)
+    if ledger:
+        try:
+            acquired, window, retry_after = ledger.acquire(_quota_caller, timeout=timeout)
+            return acquired, "daily" if window == "day" else "rate", retry_after
+        except Exception as e:
+            print(f"⚠️ Quota ledger error, using local limits: {str(e)[:100]}")
+    if _rate_limiter.acquire(timeout=timeout):
+        return True, None, None
+    if _rate_limiter.remaining_today() == 0:
+        return False, "daily", _rate_limiter.day_resets_in()
+    return False, "rate", None
+
+def set_quota_caller(caller):
+    """Count this process's Gemini requests as 'interactive' or 'batch' in the shared ledger"""
+    global _quota_caller
+    
+    if caller not in CALLERS:
+        raise ValueError(f"Unknown quota caller: {caller}")
+    _quota_caller = caller
+
+def get_quota_usage():
+    """Shared Gemini usage per caller for the current minute and day (None without a ledger)"""
+    ledger = get_quota_ledger(GEMINI_RPM, GEMINI_RPD)
+    if not ledger:
+        return None
+    try:
+        return ledger.usage()
+    except Exception as e:
+        print(f"⚠️ Could not read Gemini quota usage: {str(e)[:100]}")
+        return None
+
+def _open_circuit(kind, retry_after=None):
+    """Stop Gemini calls for a while after a rate-limit or quota error"""
+    cooldown = _breaker.record_failure(kind, retry_after)
+    metrics.inc("gemini_circuit_opened", reason=kind)
+    label = "daily quota" if kind == "daily" else "per-minute rate limit"
+    print(f"⚠️ Gemini {label} hit, using free titles for {cooldown:.0f}s")
+
+def _clean_title(title):
+    """Normalize a raw model title into a short single-line chapter title"""
+    title = title.strip()
+    
+    # Clean up the response
+    title = title.replace('"', '').replace("'", "").strip()
+    
+    # Remove any extra text after the title
+    if '\n' in title:
+        title = title.split('\n')[0]
+    
+    # Ensure it's not too long
+    if len(title) > 50:
+        title = title[:47] + "..."
         
-        # Clean up the response
-        title = title.replace('"', '').replace("'", "").strip()
+    return title
+
+def _quota_kind(e):
+    """'daily' or 'rate' if a Gemini error means we hit a limit, else None"""
+    message = str(e)
+    if not _QUOTA_ERROR_RE.search(message):
+        return None
+    return "daily" if _DAILY_QUOTA_RE.search(message) else "rate"
+
+def _retry_after(e):
+    """Retry delay in seconds suggested by a Gemini error, if it has one"""
+    retry_after = getattr(e, "retry_after", None)
+    if retry_after is not None:
+        return float(retry_after)
+    message = str(e)
+    for pattern in _RETRY_AFTER_RES:
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
+
+def _is_limit_error(e):
+    """Errors that mean Gemini shouldn't be called again right now"""
+    return isinstance(e, CircuitOpenError) or _quota_kind(e) is not None
+
+def summarize_chunks(chunks, batch_size=BATCH_SIZE, max_workers=MAX_CONCURRENCY):
+    """
+    Generate chapter titles for many chunks at once.
+    In premium mode, chunks are packed into batched Gemini prompts so a whole
+    video needs only a request or two; batches run concurrently behind the
+    shared rate limiter, failed slices are split and retried, and anything
+    Gemini can't title falls back to the free method with keywords picked by
+    TF-IDF across the whole video.
+    """
+    titles = [None] * len(chunks)
+    with metrics.span("summarize", mode="batch") as span:
+        span.set(chunks=len(chunks))
+        for start, block in iter_chunk_titles(chunks, batch_size, max_workers):
+            titles[start:start + len(block)] = block
+    return titles
+
+def iter_chunk_titles(chunks, batch_size=BATCH_SIZE, max_workers=MAX_CONCURRENCY, stats=None):
+    """
+    Same titles as summarize_chunks, yielded as soon as they are ready.
+    Yields (start, titles) for consecutive runs of chunks in order, so the
+    first chapters can be shown after one request instead of the whole video.
+    If given, stats["free_titles"] counts the chunks that got a free title.
+    """
+    titles = [None] * len(chunks)
+    ready = [False] * len(chunks)
+    keywords = None
+    emitted = 0
+    
+    def finish(indices):
+        # Anything Gemini didn't title gets a free title with video-wide keywords
+        nonlocal keywords
+        fallbacks = 0
+        for i in indices:
+            if titles[i] is None:
+                if keywords is None:
+                    keywords = tfidf_keywords(chunks)
+                titles[i] = _summarize_chunk_free(chunks[i], keywords[i])
+                fallbacks += 1
+            ready[i] = True
+        if fallbacks:
+            metrics.inc("titles", fallbacks, source="free")
+            if stats is not None:
+                stats["free_titles"] = stats.get("free_titles", 0) + fallbacks
+    
+    def advance():
+        nonlocal emitted
+        start = emitted
+        while emitted < len(chunks) and ready[emitted]:
+            emitted += 1
+        return start
+    
+    if _gemini_ready():
+        # Reuse titles we already paid for; only cache misses go to Gemini
+        pending = []
+        for i, chunk in enumerate(chunks):
+            titles[i] = _cached_title(chunk, "gemini")
+            if titles[i] is None:
+                pending.append(i)
+            else:
+                ready[i] = True
+        if len(pending) < len(chunks):
+            metrics.inc("titles", len(chunks) - len(pending), source="cache")
+        
+        start = advance()
+        if emitted > start:
+            yield start, titles[start:emitted]
         
-        # Remove any extra text after the title
-        if '\n' in title:
-            title = title.split('\n')[0]
+        batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
         
-        # Ensure it's not too long
-        if len(title) > 50:
-            title = title[:47] + "..."
+        def run_batch(indices):
+            if _breaker.available():
+                with metrics.span("gemini_batch") as span:
+                    span.set(chunks=len(indices))
+                    _summarize_batch(chunks, indices, titles)
+                titled = 0
+                for i in indices:
+                    if titles[i] is not None:
+                        _store_title(chunks[i], "gemini", titles[i])
+                        titled += 1
+                metrics.inc("titles", titled, source="gemini")
+        
+        if batches and _breaker.status()["state"] == CircuitBreaker.HALF_OPEN:
+            # Recovering from a rate limit: one batch probes before we fan out
+            probe = batches.pop(0)
+            try:
+                run_batch(probe)
+            except Exception as e:
+                _handle_gemini_error(e)
+            finish(probe)
             
-        return title
+            start = advance()
+            if emitted > start:
+                yield start, titles[start:emitted]
         
+        pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches) or 1)))
+        try:
+            futures = {metrics.submit(pool, run_batch, indices): indices for indices in batches}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    _handle_gemini_error(e)
+                finish(futures[future])
+                
+                start = advance()
+                if emitted > start:
+                    yield start, titles[start:emitted]
+        finally:
+            # Don't start queued batches if the caller stopped listening
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    else:
+        for start in range(0, len(chunks), batch_size):
+            finish(range(start, min(start + batch_size, len(chunks))))
+            start = advance()
+            yield start, titles[start:emitted]
+
+def _handle_gemini_error(e):
+    """Log a Gemini failure (limit errors were already reported by the circuit breaker)"""
+    if not _is_limit_error(e):
+        print(f"⚠️ Gemini error: {str(e)[:100]}...")
+
+def _summarize_batch(chunks, indices, titles):
+    """
+    Title the chunks at `indices` with one request, filling `titles` in place.
+    Missing titles are retried; a request that fails outright is split in half.
+    Chunks that still can't be titled are left as None for the free fallback.
+    Rate-limit and quota errors are re-raised so the caller stops using Gemini.
+    """
+    try:
+        batch_titles = _summarize_chunks_gemini([chunks[i] for i in indices])
     except Exception as e:
-        raise Exception(f"Gemini generation failed: {e}")
+        if _is_limit_error(e):
+            raise
+        if len(indices) == 1:
+            print(f"⚠️ Gemini error: {str(e)[:100]}...")
+            return
+        print(f"⚠️ Batch of {len(indices)} failed, splitting: {str(e)[:80]}...")
+        mid = len(indices) // 2
+        _summarize_batch(chunks, indices[:mid], titles)
+        _summarize_batch(chunks, indices[mid:], titles)
+        return
+    
+    missing = []
+    for position, i in enumerate(indices):
+        title = batch_titles.get(position)
+        if title:
+            titles[i] = title
+        else:
+            missing.append(i)
+    
+    if missing and len(missing) < len(indices):
+        # Only retry the slice the model skipped
+        _summarize_batch(chunks, missing, titles)
+    elif missing and len(indices) > 1:
+        mid = len(indices) // 2
+        _summarize_batch(chunks, indices[:mid], titles)
+        _summarize_batch(chunks, indices[mid:], titles)
 
-def _summarize_chunk_free(chunk):
-    """Generate chapter title using free NLP methods (no API required)"""
-    if not chunk or len(chunk.strip()) < 10:
-        return "📝 Short Segment"
+def _summarize_chunks_gemini(chunks):
+    """
+    Ask Gemini for titles for several chunks in a single structured prompt.
+    Returns a dict mapping the chunk position within `chunks` to its title.
+    """
+    if not _gemini_client:
+        raise Exception("Gemini client not available")
+    
+    segments = "\n".join(
+        json.dumps({"id": i, "transcript": chunk[:500]}, ensure_ascii=False)
+        for i, chunk in enumerate(chunks)
+    )
+    
+    prompt = f"""Generate a concise, engaging chapter title (maximum 6 words) for each of the following video transcript segments.
+    Make each title descriptive and interesting. Add a relevant emoji at the beginning if appropriate.
+    
+    Rules:
+    - Maximum 6 words per title
+    - Be specific and descriptive
+    - Use action words when possible
+    - Add emoji if it enhances understanding
+    - Make it sound like a YouTube chapter
+    
+    Respond with ONLY a JSON array with one object per segment, in the same order:
+    [{{"id": 0, "title": "..."}}, {{"id": 1, "title": "..."}}]
+    
+    Segments (one JSON object per line):
+{segments}"""
+    
+    response = _generate(
+        prompt,
+        generation_config={"response_mime_type": "application/json"}
+    )
+    return _parse_batch_titles(response.text, len(chunks))
+
+def _parse_batch_titles(raw, count):
+    """Parse a JSON list of titles from a batched Gemini response"""
+    text = raw.strip()
+    start, end = text.find('['), text.rfind(']')
+    if start == -1 or end <= start:
+        raise Exception("Gemini batch response was not a JSON list")
+    
+    try:
+        items = json.loads(text[start:end + 1])
+    except ValueError as e:
+        raise Exception(f"Could not parse Gemini batch response: {e}")
+    
+    titles = {}
+    for position, item in enumerate(items):
+        if isinstance(item, dict):
+            index, title = item.get("id", position), item.get("title")
+        else:
+            index, title = position, item
+        
+        if isinstance(index, str) and index.isdigit():
+            index = int(index)
+        if isinstance(index, int) and 0 <= index < count and isinstance(title, str) and title.strip():
+            titles[index] = _clean_title(title)
+    
+    return titles
+
+# Stop words ignored when picking title keywords
+_STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 
+    'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 
+    'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 
+    'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those', 'i', 
+    'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them',
+    'my', 'your', 'his', 'its', 'our', 'their', 'just', 'now', 'then',
+    'here', 'there', 'when', 'where', 'why', 'how', 'what', 'who', 'which'
+})
+
+_NON_WORD_RE = re.compile(r'[^\w\s]')
+
+# Content type patterns, highest priority first
+_CONTENT_PATTERNS = (
+    ('intro', ['welcome', 'hello', 'introduction', 'start', 'begin', 'today we', 'let me introduce']),
+    ('conclusion', ['conclusion', 'summary', 'wrap up', 'in summary', 'to conclude', 'finally', 'thank you', 'that concludes']),
+    ('tutorial', ['learn', 'tutorial', 'how to', 'let me show', 'demonstrate', 'explain', 'teach']),
+    ('problem', ['problem', 'issue', 'challenge', 'difficult', 'error', 'trouble', 'fix', 'solve']),
+    ('excitement', ['amazing', 'incredible', 'fantastic', 'awesome', 'brilliant', 'outstanding', 'wow', 'great']),
+    ('example', ['example', 'demo', 'demonstration', 'for instance', 'let me show', 'practical']),
+    ('qa', ['question', 'answer', 'ask', 'discuss', 'what about', 'how about']),
+    ('analysis', ['analyze', 'analysis', 'review', 'compare', 'evaluation', 'study', 'research']),
+    ('future', ['future', 'next', 'upcoming', 'plan', 'going forward', 'what\'s next']),
+)
+
+def _trie_regex(patterns):
+    """
+    Compile literal patterns into one prefix-factored regex.
+    At any position it matches the longest pattern that starts there.
+    """
+    trie = {}
+    for pattern in patterns:
+        node = trie
+        for char in pattern:
+            node = node.setdefault(char, {})
+        node[''] = True
+    
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return '(?:' + body + ')?' if '' in node else body
     
-    # Clean and analyze the text
-    clean_text = re.sub(r'[^\w\s]', ' ', chunk.lower())
-    words = clean_text.split()
-    
-    # Remove stop words
-    stop_words = {
-        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 
-        'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 
-        'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 
-        'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those', 'i', 
-        'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them',
-        'my', 'your', 'his', 'her', 'its', 'our', 'their', 'just', 'now', 'then',
-        'here', 'there', 'when', 'where', 'why', 'how', 'what', 'who', 'which'
+    return re.compile(build(trie))
+
+_CONTENT_RE = _trie_regex({p for _, patterns in _CONTENT_PATTERNS for p in patterns})
+
+# Every pattern that matches at a position is a prefix of the longest match
+# there, so a match's priority is the best priority among its prefixes
+def _match_priorities():
+    own = {}
+    for priority, (_, patterns) in enumerate(_CONTENT_PATTERNS):
+        for pattern in patterns:
+            own.setdefault(pattern, priority)
+    return {
+        pattern: min(priority for prefix, priority in own.items() if pattern.startswith(prefix))
+        for pattern in own
     }
+
+_MATCH_PRIORITY = _match_priorities()
+
+def _classify_content(text_lower):
+    """Highest-priority content type whose pattern appears in the text, or None"""
+    best = None
+    match = _CONTENT_RE.search(text_lower)
+    while match:
+        priority = _MATCH_PRIORITY[match.group()]
+        if best is None or priority < best:
+            best = priority
+            if best == 0:
+                break
+        # Resume just after the match start so overlapping patterns are still seen
+        match = _CONTENT_RE.search(text_lower, match.start() + 1)
+    return _CONTENT_PATTERNS[best][0] if best is not None else None
+
+def _top_keywords(chunk, count=3):
+    """Most frequent meaningful words in the chunk as (word, frequency) pairs"""
+    return Counter(_tokenize_keywords(chunk)).most_common(count)
+
+def _tokenize_keywords(chunk):
+    """Meaningful lowercase words of a chunk (stop words and short words removed)"""
+    words = _NON_WORD_RE.sub(' ', chunk.lower()).split()
+    return [word for word in words if len(word) > 2 and word not in _STOP_WORDS]
+
+def tfidf_keywords(chunks, count=3):
+    """
+    Most distinctive words of every chunk, scored by TF-IDF across all chunks.
     
-    # Get meaningful words
-    meaningful_words = [word for word in words if word not in stop_words and len(word) > 2]
+    The whole video is handled in one vectorized pass over a sparse
+    (chunk, term, frequency) table, so words that show up in every chapter
+    ("python", "learning") stop dominating each title. Ties fall back to raw
+    frequency, so a single chunk gets the same keywords as _top_keywords.
+    """
+    vocabulary = {}
+    doc_ids, term_ids = [], []
+    for doc, chunk in enumerate(chunks):
+        for word in _tokenize_keywords(chunk):
+            doc_ids.append(doc)
+            term_ids.append(vocabulary.setdefault(word, len(vocabulary)))
     
-    # Count word frequency
-    word_freq = {}
-    for word in meaningful_words:
-        word_freq[word] = word_freq.get(word, 0) + 1
+    keywords = [[] for _ in chunks]
+    if not term_ids:
+        return keywords
     
-    # Get top keywords
-    top_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:3]
+    n_docs, n_terms = len(chunks), len(vocabulary)
+    # Sparse document-term matrix as unique (doc, term) cells with counts
+    cells, tf = np.unique(
+        np.asarray(doc_ids, dtype=np.int64) * n_terms + np.asarray(term_ids, dtype=np.int64),
+        return_counts=True
+    )
+    rows, cols = np.divmod(cells, n_terms)
     
-    # Content type detection with better patterns
-    text_lower = chunk.lower()
+    df = np.bincount(cols, minlength=n_terms)
+    idf = np.log((1.0 + n_docs) / (1.0 + df))
+    doc_lengths = np.bincount(rows, minlength=n_docs)
+    scores = tf / doc_lengths[rows] * idf[cols]
     
-    # Introduction patterns
-    intro_patterns = ['welcome', 'hello', 'introduction', 'start', 'begin', 'today we', 'let me introduce']
-    if any(pattern in text_lower for pattern in intro_patterns):
-        return "🎬 Introduction & Welcome"
+    # Sort cells by chunk, then score, then frequency, then first appearance
+    order = np.lexsort((cols, -tf, -scores, rows))
+    rows, cols = rows[order], cols[order]
     
-    # Conclusion patterns
-    conclusion_patterns = ['conclusion', 'summary', 'wrap up', 'in summary', 'to conclude', 'finally', 'thank you', 'that concludes']
-    if any(pattern in text_lower for pattern in conclusion_patterns):
-        return "🎯 Conclusion & Summary"
+    # Rank of each cell within its chunk; keep the first `count`
+    starts = np.searchsorted(rows, np.arange(n_docs))
+    rank = np.arange(len(rows)) - starts[rows]
+    keep = rank < count
     
-    # Tutorial/Learning patterns
-    tutorial_patterns = ['learn', 'tutorial', 'how to', 'let me show', 'demonstrate', 'explain', 'teach']
-    if any(pattern in text_lower for pattern in tutorial_patterns):
-        topic = top_words[0][0].title() if top_words else "Concepts"
-        return f"📚 Learning {topic}"
+    words = np.array(list(vocabulary), dtype=object)
+    for doc, term in zip(rows[keep].tolist(), cols[keep].tolist()):
+        keywords[doc].append(words[term])
     
-    # Problem/Challenge patterns
-    problem_patterns = ['problem', 'issue', 'challenge', 'difficult', 'error', 'trouble', 'fix', 'solve']
-    if any(pattern in text_lower for pattern in problem_patterns):
-        return "⚠️ Challenges & Solutions"
+    return keywords
+
+def _summarize_chunks_free(chunks):
+    """Free-mode titles for a whole video, using TF-IDF keywords across its chunks"""
+    with metrics.span("summarize", mode="free") as span:
+        span.set(chunks=len(chunks))
+        return [
+            _summarize_chunk_free(chunk, keywords)
+            for chunk, keywords in zip(chunks, tfidf_keywords(chunks))
+        ]
+
+def _summarize_chunk_free(chunk, keywords=None):
+    """
+    Generate chapter title using free NLP methods (no API required).
+    `keywords` can supply precomputed top keywords (e.g. from tfidf_keywords);
+    otherwise the chunk's most frequent words are used.
+    """
+    if not chunk or len(chunk.strip()) < 10:
+        return "📝 Short Segment"
     
-    # Excitement/Highlight patterns
-    excitement_patterns = ['amazing', 'incredible', 'fantastic', 'awesome', 'brilliant', 'outstanding', 'wow', 'great']
-    if any(pattern in text_lower for pattern in excitement_patterns):
-        topic = top_words[0][0].title() if top_words else "Highlights"
-        return f"🔥 {topic} Spotlight"
+    # Content type detection in a single scan
+    content_type = _classify_content(chunk.lower())
     
-    # Example/Demo patterns
-    example_patterns = ['example', 'demo', 'demonstration', 'for instance', 'let me show', 'practical']
-    if any(pattern in text_lower for pattern in example_patterns):
+    if content_type == 'intro':
+        return "🎬 Introduction & Welcome"
+    if content_type == 'conclusion':
+        return "🎯 Conclusion & Summary"
+    if content_type == 'problem':
+        return "⚠️ Challenges & Solutions"
+    if content_type == 'example':
         return "💡 Practical Examples"
-    
-    # Q&A patterns
-    qa_patterns = ['question', 'answer', 'ask', 'discuss', 'what about', 'how about']
-    if any(pattern in text_lower for pattern in qa_patterns):
+    if content_type == 'qa':
         return "❓ Q&A Discussion"
+    if content_type == 'future':
+        return "🚀 Future Directions"
     
-    # Technical/Analysis patterns
-    analysis_patterns = ['analyze', 'analysis', 'review', 'compare', 'evaluation', 'study', 'research']
-    if any(pattern in text_lower for pattern in analysis_patterns):
-        topic = top_words[0][0].title() if top_words else "Content"
-        return f"📊 {topic} Analysis"
+    # Remaining titles need the chunk's keywords
+    if keywords is None:
+        top_words = [word for word, _ in _top_keywords(chunk)]
+    else:
+        top_words = keywords
     
-    # Future/Next steps patterns
-    future_patterns = ['future', 'next', 'upcoming', 'plan', 'going forward', 'what\'s next']
-    if any(pattern in text_lower for pattern in future_patterns):
-        return "🚀 Future Directions"
+    if content_type == 'tutorial':
+        topic = top_words[0].title() if top_words else "Concepts"
+        return f"📚 Learning {topic}"
+    if content_type == 'excitement':
+        topic = top_words[0].title() if top_words else "Highlights"
+        return f"🔥 {topic} Spotlight"
+    if content_type == 'analysis':
+        topic = top_words[0].title() if top_words else "Content"
+        return f"📊 {topic} Analysis"
     
     # Use top keywords if available
     if top_words:
         if len(top_words) >= 2:
-            return f"📖 {top_words[0][0].title()} & {top_words[1][0].title()}"
+            return f"📖 {top_words[0].title()} & {top_words[1].title()}"
         else:
-            return f"📖 Focus on {top_words[0][0].title()}"
+            return f"📖 Focus on {top_words[0].title()}"
     
     # Sentiment-based fallback
     try:
@@ -205,13 +745,20 @@ def _summarize_chunk_free(chunk):
 
 def get_summarization_status():
     """Return current summarization method status"""
-    global _gemini_available, _quota_exceeded
-    
-    if _gemini_available and not _quota_exceeded and _gemini_client:
+    if _gemini_ready():
+        if _model_backend not in (None, "google"):
+            return "premium", f"🧪 AI-Powered Titles ({_model_backend} backend)"
         return "premium", "🤖 AI-Powered Titles (Gemini)"
+    elif _gemini_available and _gemini_client:
+        label = "daily quota" if _breaker.reason == "daily" else "rate limit"
+        return "free", f"⏳ Smart Keyword Titles (Gemini {label} hit, retrying in {_breaker.retry_in():.0f}s)"
     else:
         return "free", "📝 Smart Keyword Titles"
 
+def get_gemini_circuit_status():
+    """State of the Gemini circuit breaker (closed, open or half_open)"""
+    return _breaker.status()
+
 def test_summarization():
     """Test function to verify methods work"""
     test_chunks = [
@@ -230,6 +777,10 @@ def test_summarization():
         print(f"Test {i}: {title}")
         print(f"Input: {chunk[:50]}...")
         print()
+    
+    print("Batched titles:")
+    for i, title in enumerate(summarize_chunks(test_chunks), 1):
+        print(f"Batch {i}: {title}")
 
 if __name__ == "__main__":
     test_summarization()
\ No newline at end of file
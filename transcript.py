@@ -0,0 +1,154 @@
+import numpy as np
+
+
+class Transcript:
+    """
+    Compact, columnar transcript.
+
+    Segment start times and durations are stored as float32 arrays and all
+    segment texts live in one string buffer addressed by int32 offsets, instead
+    of one {'text', 'start', 'duration'} dict per segment. Indexing, iteration
+    and len() still behave like the old list of dicts, so existing callers
+    keep working.
+    """
+
+    __slots__ = ('starts', 'durations', '_buffer', '_offsets', '_word_offsets')
+
+    def __init__(self, starts, durations, buffer, offsets):
+        self.starts = np.asarray(starts, dtype=np.float32)
+        self.durations = np.asarray(durations, dtype=np.float32)
+        self._buffer = buffer
+        # offsets[i] is where segment i starts in the buffer; segments are
+        # separated by a single space, so offsets[-1] == len(buffer) + 1
+        self._offsets = np.asarray(offsets, dtype=np.int32)
+        self._word_offsets = None
+
+    @classmethod
+    def from_segments(cls, segments):
+        """Build from an iterable of {'text', 'start', 'duration'} dicts"""
+        if isinstance(segments, Transcript):
+            return segments
+
+        starts, durations, texts = [], [], []
+        for segment in segments:
+            starts.append(segment['start'])
+            durations.append(segment.get('duration', 0))
+            texts.append(segment['text'])
+        return cls.from_columns(starts, durations, texts)
+
+    @classmethod
+    def from_columns(cls, starts, durations, texts):
+        """Build from parallel start, duration and text sequences"""
+        lengths = np.fromiter((len(text) + 1 for text in texts), dtype=np.int32, count=len(texts))
+        offsets = np.zeros(len(texts) + 1, dtype=np.int32)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(starts, durations, " ".join(texts), offsets)
+
+    @classmethod
+    def from_words(cls, text, seconds_per_word):
+        """One segment per word with evenly spaced synthetic timestamps"""
+        words = text.split()
+        starts = np.arange(len(words), dtype=np.float32) * np.float32(seconds_per_word)
+        durations = np.full(len(words), seconds_per_word, dtype=np.float32)
+        return cls.from_columns(starts, durations, words)
+
+    @classmethod
+    def from_cached(cls, data):
+        """Rebuild from to_dict() output (or a legacy list of segment dicts)"""
+        if isinstance(data, dict):
+            return cls(data['starts'], data['durations'], data['buffer'], data['offsets'])
+        return cls.from_segments(data)
+
+    def to_dict(self):
+        """JSON-serializable columnar form"""
+        return {
+            'starts': self.starts.tolist(),
+            'durations': self.durations.tolist(),
+            'buffer': self._buffer,
+            'offsets': self._offsets.tolist(),
+        }
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __bool__(self):
+        return len(self.starts) > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            first, last, step = index.indices(len(self))
+            if step != 1:
+                return Transcript.from_segments(self[i] for i in range(first, last, step))
+            last = max(first, last)
+            base = self._offsets[first]
+            return Transcript(
+                self.starts[first:last],
+                self.durations[first:last],
+                self._buffer[base:max(base, self._offsets[last] - 1)],
+                self._offsets[first:last + 1] - base,
+            )
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("transcript index out of range")
+        return {
+            'text': self.text_at(index),
+            'start': float(self.starts[index]),
+            'duration': float(self.durations[index]),
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def text_at(self, index):
+        """Text of a single segment"""
+        return self._buffer[self._offsets[index]:self._offsets[index + 1] - 1]
+
+    def text_range(self, first, last):
+        """Text of segments first..last-1 as one whitespace-normalized string"""
+        if last <= first:
+            return ""
+        return " ".join(self._buffer[self._offsets[first]:self._offsets[last] - 1].split())
+
+    @property
+    def text(self):
+        """Full transcript text"""
+        return self.text_range(0, len(self))
+
+    @property
+    def ends(self):
+        """End time of every segment"""
+        return self.starts + self.durations
+
+    @property
+    def duration(self):
+        """Time at which the last segment ends"""
+        if not len(self):
+            return 0.0
+        return float(self.starts[-1] + self.durations[-1])
+
+    def word_offsets(self):
+        """
+        Cumulative word counts (int32, length len + 1).
+        word_offsets()[i] is the number of words before segment i.
+        """
+        if self._word_offsets is None:
+            counts = np.fromiter(
+                (len(self.text_at(i).split()) for i in range(len(self))),
+                dtype=np.int32, count=len(self)
+            )
+            offsets = np.zeros(len(self) + 1, dtype=np.int32)
+            np.cumsum(counts, out=offsets[1:])
+            self._word_offsets = offsets
+        return self._word_offsets
+
+    def segment_at_time(self, seconds):
+        """Index of the segment playing at the given time"""
+        return max(0, int(np.searchsorted(self.starts, seconds, side='right')) - 1)
+
+    def segment_for_word(self, word_index):
+        """Index of the segment containing the given word"""
+        offsets = self.word_offsets()
+        return max(0, int(np.searchsorted(offsets, word_index, side='right')) - 1)
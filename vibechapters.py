@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Headless VibeChapters pipeline.
+
+Usage:
+    python -m vibechapters batch ids.txt --output chapters.jsonl --workers 8
+
+The input file holds one YouTube URL or video ID per line (blank lines and
+lines starting with # are ignored). Each finished video is appended to the
+output as one JSON line, so an interrupted run can be restarted with the same
+command and will skip videos that are already done. Videos whose transcript
+couldn't be fetched (rate limits, network errors) are recorded as errors;
+--retry-errors removes those records from the output and processes them again.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from get_transcript import get_transcript_with_status, extract_video_id
+from split_text import split_transcript
+from summarize import summarize_chunks, get_summarization_status, set_quota_caller
+from rate_limiter import TokenBucket
+import metrics
+
+
+def read_video_ids(path):
+    """Read video IDs (or URLs) from a file, skipping blanks, comments and duplicates"""
+    video_ids = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            video_id = extract_video_id(line)
+            if not video_id:
+                print(f"⚠️ Line {line_number}: not a YouTube URL or video ID, skipping")
+                continue
+            if video_id not in seen:
+                seen.add(video_id)
+                video_ids.append(video_id)
+    return video_ids
+
+
+def read_records(output_path):
+    """Latest record per video ID in the output file"""
+    records = {}
+    if not os.path.exists(output_path):
+        return records
+
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A run killed mid-write can leave a partial last line
+                continue
+            records[record.get("video_id")] = record
+    return records
+
+
+def repair_output(output_path):
+    """
+    Make sure the output ends with a newline before we append to it.
+    A run killed mid-write leaves a partial last line, which is cut off;
+    a complete record that just lacks its newline gets one.
+    """
+    if not os.path.exists(output_path):
+        return
+
+    with open(output_path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+
+        # Scan back for the start of the last line
+        position = size
+        line_start = 0
+        while position > 0:
+            step = min(65536, position)
+            position -= step
+            f.seek(position)
+            newline = f.read(step).rfind(b"\n")
+            if newline != -1:
+                line_start = position + newline + 1
+                break
+
+        f.seek(line_start)
+        try:
+            json.loads(f.read().decode("utf-8"))
+        except ValueError:
+            print("⚠️ Removing a partial record left by an interrupted run")
+            f.truncate(line_start)
+        else:
+            f.write(b"\n")
+
+
+def load_checkpoint(output_path, retry_errors=False):
+    """
+    Video IDs already present in the output file.
+    With retry_errors, failed records are removed from the file first so
+    the retried videos don't end up in it twice.
+    """
+    repair_output(output_path)
+    records = read_records(output_path)
+    if retry_errors and os.path.exists(output_path):
+        records = {video_id: record for video_id, record in records.items() if record.get("status") != "error"}
+        temp_path = output_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for record in records.values():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(temp_path, output_path)
+    return set(records)
+
+
+def process_video(video_id, max_words=100, fetch_limiter=None):
+    """Run transcript -> chunks -> titles for one video and return a result record"""
+    started = time.monotonic()
+    try:
+        if fetch_limiter:
+            fetch_limiter.acquire()
+        text, transcript, failure = get_transcript_with_status(video_id)
+        if not text:
+            # Rate limits and network errors are worth retrying; missing captions aren't
+            if failure != "no_captions":
+                raise Exception(f"Transcript fetch failed ({failure})")
+            return {
+                "video_id": video_id,
+                "status": "no_transcript",
+                "chapters": [],
+                "elapsed": round(time.monotonic() - started, 3),
+            }
+
+        with metrics.span("chunking") as span:
+            chunks = list(split_transcript(transcript, max_words=max_words))
+            span.set(chunks=len(chunks))
+        titles = summarize_chunks([chunk['text'] for chunk in chunks])
+
+        return {
+            "video_id": video_id,
+            "status": "ok",
+            "chapters": [
+                {
+                    "title": title,
+                    "start": round(chunk['start'], 2),
+                    "end": round(chunk['end'], 2),
+                    "words": chunk['word_end'] - chunk['word_start'],
+                }
+                for chunk, title in zip(chunks, titles)
+            ],
+            "elapsed": round(time.monotonic() - started, 3),
+        }
+    except Exception as e:
+        metrics.inc("video_errors")
+        return {
+            "video_id": video_id,
+            "status": "error",
+            "error": str(e)[:500],
+            "chapters": [],
+            "elapsed": round(time.monotonic() - started, 3),
+        }
+
+
+def run_batch(input_path, output_path, workers=4, max_words=100, fetch_rpm=30, retry_errors=False):
+    """Chapter every video in input_path, streaming results to output_path"""
+    video_ids = read_video_ids(input_path)
+    done = load_checkpoint(output_path, retry_errors=retry_errors)
+    todo = [video_id for video_id in video_ids if video_id not in done]
+
+    # Batch jobs share the Gemini key fairly with anyone using the app
+    set_quota_caller("batch")
+
+    method_type, method_desc = get_summarization_status()
+    print(f"📋 {len(video_ids)} videos, {len(video_ids) - len(todo)} already done, {len(todo)} to process")
+    print(f"🤖 Titles: {method_desc}")
+
+    # One limiter shared by every worker so YouTube sees a steady request rate;
+    # Gemini calls are already throttled by the quota ledger in summarize.py
+    fetch_limiter = TokenBucket(fetch_rpm, capacity=max(1, workers)) if fetch_rpm else None
+    write_lock = threading.Lock()
+    counts = {"ok": 0, "no_transcript": 0, "error": 0}
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        with open(output_path, "a", encoding="utf-8") as out:
+            futures = {
+                metrics.submit(pool, process_video, video_id, max_words, fetch_limiter): video_id
+                for video_id in todo
+            }
+            for completed, future in enumerate(as_completed(futures), 1):
+                record = future.result()
+                with write_lock:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                counts[record["status"]] += 1
+                metrics.inc("videos", status=record["status"])
+                metrics.get_metrics().observe("video", record["elapsed"])
+                print(f"[{completed}/{len(todo)}] {record['video_id']}: {record['status']} "
+                      f"({len(record['chapters'])} chapters, {record['elapsed']}s)")
+    except BaseException:
+        # Ctrl-C or a write error: drop the queued videos instead of processing
+        # them (and spending quota) for results that would never be written
+        print("⏹️ Stopping: queued videos cancelled, rerun the same command to resume")
+        raise
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    print(f"✅ Done: {counts['ok']} ok, {counts['no_transcript']} without captions, {counts['error']} errors")
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="vibechapters", description="VibeChapters command line tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch = subparsers.add_parser("batch", help="Generate chapters for many videos")
+    batch.add_argument("input", help="File with one YouTube URL or video ID per line")
+    batch.add_argument("-o", "--output", default="chapters.jsonl", help="JSONL output file (also the checkpoint)")
+    batch.add_argument("-w", "--workers", type=int, default=4, help="Videos processed in parallel")
+    batch.add_argument("--max-words", type=int, default=100, help="Words per chapter")
+    batch.add_argument("--fetch-rpm", type=int, default=30,
+                       help="Transcript fetches per minute across all workers (0 = unlimited)")
+    batch.add_argument("--retry-errors", action="store_true", help="Reprocess videos that failed last time")
+    batch.add_argument("--metrics", help="Write Prometheus text-format metrics here when done")
+    batch.add_argument("--trace", help="Write a JSON trace of every timed stage here when done")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "batch":
+        with metrics.trace(f"batch:{args.input}") as run_trace:
+            counts = run_batch(
+                args.input,
+                args.output,
+                workers=args.workers,
+                max_words=args.max_words,
+                fetch_rpm=args.fetch_rpm,
+                retry_errors=args.retry_errors,
+            )
+
+        if args.metrics:
+            with open(args.metrics, "w", encoding="utf-8") as f:
+                f.write(metrics.get_metrics().prometheus_text())
+        if args.trace:
+            run_trace.write(args.trace)
+        return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())